@@ -2011,6 +2011,7 @@ if is_torch_available():
         "DEFAULT_ADAPTER_CONFIG",
         "DEFAULT_ADAPTERFUSION_CONFIG",
         "MODEL_WITH_HEADS_MAPPING",
+        "AdapterActivationCache",
         "AdapterArguments",
         "AdapterConfig",
         "AdapterConfigBase",
@@ -4554,6 +4555,7 @@ if TYPE_CHECKING:
             DEFAULT_ADAPTER_CONFIG,
             DEFAULT_ADAPTERFUSION_CONFIG,
             MODEL_WITH_HEADS_MAPPING,
+            AdapterActivationCache,
             AdapterArguments,
             AdapterConfig,
             AdapterConfigBase,
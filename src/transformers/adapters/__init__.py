@@ -60,6 +60,7 @@ _import_structure = {
         "UniPELTConfig",
     ],
     "context": [
+        "AdapterActivationCache",
         "AdapterSetup",
         "ForwardContext",
     ],
@@ -184,7 +185,7 @@ if TYPE_CHECKING:
         StaticAdapterFusionConfig,
         UniPELTConfig,
     )
-    from .context import AdapterSetup, ForwardContext
+    from .context import AdapterActivationCache, AdapterSetup, ForwardContext
     from .heads import (
         BertStyleMaskedLMHead,
         BiaffineParsingHead,
@@ -1,11 +1,14 @@
 import itertools
+import sys
 from collections.abc import Sequence
-from typing import List, Set, Union
+from typing import FrozenSet, List, Union
 
 
 class AdapterCompositionBlock(Sequence):
     def __init__(self, *children):
         self.children = [parse_composition(b, None) for b in children]
+        # names of all adapters in this block, lazily computed by flatten()
+        self._flat_cache = None
 
     def __getitem__(self, key):
         return self.children[key]
@@ -39,8 +42,12 @@ class AdapterCompositionBlock(Sequence):
     def parallel_channels(self):
         return max([b.parallel_channels if isinstance(b, AdapterCompositionBlock) else 1 for b in self.children])
 
-    def flatten(self) -> Set[str]:
-        return set(itertools.chain(*[[b] if isinstance(b, str) else b.flatten() for b in self.children]))
+    def flatten(self) -> FrozenSet[str]:
+        if self._flat_cache is None:
+            self._flat_cache = frozenset(
+                itertools.chain(*[[b] if isinstance(b, str) else b.flatten() for b in self.children])
+            )
+        return self._flat_cache
 
 
 class Parallel(AdapterCompositionBlock):
@@ -65,11 +72,13 @@ class Stack(AdapterCompositionBlock):
 class Fuse(AdapterCompositionBlock):
     def __init__(self, *fuse_stacks: List[Union[AdapterCompositionBlock, str]]):
         super().__init__(*fuse_stacks)
+        # the name is used as key of the fusion layers, so it's computed only once
+        self._name = sys.intern(",".join([c if isinstance(c, str) else c.last() for c in self.children]))
 
     # TODO-V2 pull this up to all block classes?
     @property
     def name(self):
-        return ",".join([c if isinstance(c, str) else c.last() for c in self.children])
+        return self._name
 
 
 class Split(AdapterCompositionBlock):
@@ -130,6 +139,9 @@ def validate_composition(adapter_composition: AdapterCompositionBlock, level=0,
         for child in adapter_composition:
             if not type(child) in ALLOWED_NESTINGS[type(adapter_composition)]:
                 raise ValueError(f"Adapter setup is invalid. Cannot nest {child} in {adapter_composition}")
+            # nested stacks can only contain single adapters
+            if level > 0 and isinstance(adapter_composition, Stack) and isinstance(child, AdapterCompositionBlock):
+                raise ValueError(f"Adapter setup is too deep. Cannot have {child} at level {level + 1}.")
             # recursively validate children
             validate_composition(child, level=level + 1)
 
@@ -1,6 +1,8 @@
 import functools
 import threading
 
+import torch
+
 from .composition import parse_composition, parse_heads_from_composition
 
 
@@ -67,6 +69,67 @@ class AdapterSetup:
         return None
 
 
+class AdapterActivationCache:
+    """
+    In-memory cache of the bottleneck activations (i.e. the outputs of the down-projections) of frozen adapters. The
+    activations are stored per input example, identified by its token ids, attention mask, token type ids and position
+    ids. When an example is passed through the model again, the cached activations are reused instead of being
+    recomputed. Sub-batches of an example batch (e.g. in ``BatchSplit`` blocks) are computed without the cache.
+
+    Activations are only cached for adapters with frozen down-projections whose inputs don't depend on trainable
+    parameters, which is detected via autograd. E.g., when training AdapterFusion with frozen adapters, this applies to
+    the adapters before the first fusion layer. The cache is not used if autograd is disabled. Note that activations
+    computed in training mode are cached including the effect of dropout in the base model. The cache must be cleared
+    if frozen weights are changed.
+
+    Example::
+
+        model.set_adapter_activation_cache(AdapterActivationCache())
+        model.train_adapter_fusion(Fuse("a", "b"))
+
+    Args:
+        device (optional): The device the cached activations are stored on. Defaults to "cpu".
+    """
+
+    def __init__(self, device="cpu"):
+        self.device = device
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+
+    @staticmethod
+    def get_example_keys(*tensors):
+        """
+        Returns a key for each example of a batch, computed from the given (batch_size, ...) tensors. Tensors may be
+        None or shared by all examples (i.e. without batch dimension or with a batch size of 1, e.g. position ids).
+        """
+        rows = [t.detach().cpu().numpy() if t is not None else None for t in tensors]
+        batch_size = max((len(r) for r in rows if r is not None and r.ndim > 1), default=1)
+        rows = [r if r is None or r.ndim > 1 else r[None] for r in rows]
+        return [
+            tuple(b"" if r is None else r[i if len(r) > 1 else 0].tobytes() for r in rows) for i in range(batch_size)
+        ]
+
+    def get(self, keys, device):
+        """
+        Returns the cached activations for the given keys stacked to a batch on the given device or None if any of them
+        is missing.
+        """
+        try:
+            values = [self._cache[key] for key in keys]
+        except KeyError:
+            return None
+        return torch.stack(values).to(device, non_blocking=True)
+
+    def put(self, keys, values):
+        for key, value in zip(keys, values.detach().to(self.device)):
+            self._cache[key] = value
+
+
 class ForwardContext:
     """
     Holds context information during a forward pass through a model. This class should be used via the
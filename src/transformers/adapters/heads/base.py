@@ -651,6 +651,14 @@ class ModelWithFlexibleHeadsAdaptersMixin(ModelWithHeadsAdaptersMixin):
                     "Could not identify valid prediction head(s) from setup '{}'.".format(self.active_adapters)
                 )
 
+    def _add_head(self, head_type, head_name, overwrite_ok=False, **kwargs):
+        """
+        Creates a prediction head of the given type from ``head_types`` and adds it to the model. The keyword arguments
+        are passed to the constructor of the head class.
+        """
+        head = self.head_types[head_type](self, head_name, **kwargs)
+        self.add_prediction_head(head, overwrite_ok=overwrite_ok)
+
     def add_custom_head(self, head_type, head_name, overwrite_ok=False, set_active=True, **kwargs):
         if head_type in self.config.custom_heads:
             head = self.config.custom_heads[head_type](self, head_name, **kwargs)
@@ -1,3 +1,5 @@
+import itertools
+import sys
 from abc import ABC, abstractmethod
 from typing import List, Mapping, Union
 
@@ -8,7 +10,55 @@ from torch import nn
 from .composition import AdapterCompositionBlock, BatchSplit, Fuse, Parallel, Split, Stack
 from .configuration import AdapterConfig
 from .context import AdapterSetup, ForwardContext
-from .modeling import Adapter, BertFusion, ParallelAdapter
+from .modeling import (
+    Adapter,
+    BertFusion,
+    ParallelAdapter,
+    can_group_adapters,
+    grouped_adapter_bottleneck,
+    stack_adapter_weights,
+)
+
+
+# Op codes of compiled adapter plans (see AdapterLayer._compile_plan()).
+# The order matches the names of the dispatched methods in PLAN_FORWARDS.
+RUN_ADAPTER = 0
+FUSE = 1
+SPLIT = 2
+STACK = 3
+PARALLEL = 4
+BATCH_SPLIT = 5
+SKIP = 6
+
+# source of the state versions of adapter layers (see AdapterLayer._recompile_active())
+_STATE_VERSIONS = itertools.count()
+
+PLAN_OPS = {Stack: STACK, Fuse: FUSE, Split: SPLIT, Parallel: PARALLEL, BatchSplit: BATCH_SPLIT}
+# Methods are looked up by name on each call instead of storing bound methods on the layer, as copies of the layer
+# (e.g. replicas of nn.DataParallel) would otherwise dispatch into the methods of the original layer.
+PLAN_FORWARDS = (
+    "_forward_adapter",
+    "adapter_fusion",
+    "adapter_split",
+    "adapter_stack",
+    "adapter_parallel",
+    "adapter_batchsplit",
+    "_forward_skip",
+)
+
+
+def is_stream_capturing(tensor) -> bool:
+    """
+    Whether the current CUDA stream is captured into a CUDA graph. Tensors reused across forward passes (e.g. output
+    buffers or folded weights) must not be used while capturing, as they might be reallocated while the graph is still
+    replayed.
+    """
+    # torch.cuda.is_current_stream_capturing() is available since PyTorch 1.10, which also introduced CUDA graphs
+    return (
+        tensor.is_cuda
+        and hasattr(torch.cuda, "is_current_stream_capturing")
+        and torch.cuda.is_current_stream_capturing()
+    )
 
 
 class AdapterLayerBase(ABC):
@@ -39,11 +89,14 @@ class AdapterLayerBase(ABC):
         skip_adapters = adapter_setup is None or (
             self.config.adapters.skip_layers is not None and self.layer_idx in self.config.adapters.skip_layers
         )
-        if not skip_adapters and (len(set(module_dict.keys()) & adapter_setup.flatten()) > 0):
+        if not skip_adapters and self._contains_active_adapter(module_dict, adapter_setup):
             return adapter_setup
         else:
             return None
 
+    def _contains_active_adapter(self, module_dict, adapter_setup):
+        return not adapter_setup.flatten().isdisjoint(module_dict.keys())
+
     def _store_gating_score(self, adapter_name, gating_score):
         context = ForwardContext.get_context()
         if context.output_adapter_gating_scores:
@@ -94,6 +147,22 @@ class AdapterLayerBase(ABC):
         raise NotImplementedError()
 
 
+class FusedAdapterForward(nn.Module):
+    """
+    Computes a single adapter via the fused inference path (see ``Adapter.forward_fused()``), including
+    post-processing. Used as tracing target for ``torch.jit.trace``.
+    """
+
+    def __init__(self, adapter: Adapter, layer_norm: nn.LayerNorm):
+        super().__init__()
+        self.adapter = adapter
+        self.layer_norm = layer_norm
+
+    def forward(self, hidden_states, input_tensor):
+        output, _, _ = self.adapter.forward_fused(hidden_states, input_tensor, self.layer_norm)
+        return self.adapter.post_forward(output, hidden_states, input_tensor, self.layer_norm)
+
+
 class AdapterLayer(AdapterLayerBase, nn.Module):
     def __init__(self, location_key: str, config):
         super().__init__()
@@ -103,6 +172,20 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
     def _init_adapter_modules(self):
         self.adapters = nn.ModuleDict(dict())
         self.adapter_fusion_layer = nn.ModuleDict(dict())
+        self._eval_fused = False
+        self._eval_traced = False
+        self._fused_bottleneck = False
+        self._fold_fusion = False
+        self._traced_adapter = None
+        # stacked weights of grouped adapters reused without autograd (see _get_grouped_weights())
+        self._grouped_weights = {}
+        self._compiled_setup = None
+        self._compiled_adapters = None
+        self._compiled_plan = None
+        self._has_active_adapter_setup = None
+        self._has_active_adapter = False
+        # unique among all layers and changed on each reset of derived state, e.g. to invalidate captured CUDA graphs
+        self._state_version = next(_STATE_VERSIONS)
 
     def add_adapter(self, adapter_name: str, layer_idx: int):
         self.layer_idx = layer_idx
@@ -138,10 +221,12 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
             )
             adapter.train(self.training)  # make sure training mode is consistent
             self.adapters[adapter_name] = adapter
+            self._recompile_active()
 
     def delete_adapter(self, adapter_name: str):
         if adapter_name in self.adapters:
             del self.adapters[adapter_name]
+            self._recompile_active()
 
     def add_fusion_layer(self, adapter_names: Union[List, str]):
         """See BertModel.add_fusion_layer"""
@@ -154,12 +239,14 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
                 self.config.attention_probs_dropout_prob,
             )
             fusion.train(self.training)  # make sure training mode is consistent
-            self.adapter_fusion_layer[",".join(adapter_names)] = fusion
+            self.adapter_fusion_layer[sys.intern(",".join(adapter_names))] = fusion
+            self._recompile_active()
 
     def delete_fusion_layer(self, adapter_names: Union[List, str]):
         adapter_names = adapter_names if isinstance(adapter_names, str) else ",".join(adapter_names)
         if adapter_names in self.adapter_fusion_layer:
             del self.adapter_fusion_layer[adapter_names]
+            self._recompile_active()
 
     def enable_adapters(self, adapter_setup: AdapterCompositionBlock, unfreeze_adapters: bool, unfreeze_fusion: bool):
         """
@@ -192,182 +279,530 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
         else:
             return None
 
-    def adapter_stack(self, adapter_setup: Stack, hidden_states, input_tensor, layer_norm, lvl=0):
+    def eval_fused(self, enabled: bool = True, trace: bool = False):
         """
-        Forwards the given input through the given stack of adapters.
+        Enables or disables the fused inference path of this layer. If enabled and the layer is in evaluation mode, a
+        single active adapter is computed with the affine transformation of the Transformer LayerNorm folded into its
+        down-projection (see ``Adapter.fold_layer_norm()``). If trace is set, the fused computation is traced via
+        ``torch.jit.trace`` on its first call.
         """
-        for i, adapter_stack_layer in enumerate(adapter_setup):
-            # Break if setup is too deep
-            if isinstance(adapter_stack_layer, AdapterCompositionBlock) and lvl >= 1:
-                raise ValueError(
-                    "Specified adapter setup is too deep. Cannot have {} at level {}".format(
-                        adapter_stack_layer.__class__.__name__, lvl
-                    )
-                )
-            # Case 1: We have a nested fusion layer -> call fusion method
-            if isinstance(adapter_stack_layer, Fuse):
-                hidden_states = self.adapter_fusion(
-                    adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
-                )
-            # Case 2: We have a nested split layer -> call split method
-            elif isinstance(adapter_stack_layer, Split):
-                hidden_states = self.adapter_split(
-                    adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
-                )
-            # Case 3: We have a nested parallel layer -> call parallel method
-            elif isinstance(adapter_stack_layer, Parallel):
-                hidden_states, input_tensor = self.adapter_parallel(
-                    adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
+        self._eval_fused = enabled
+        self._eval_traced = enabled and trace
+        self._recompile_active()
+
+    def fuse_adapter_bottlenecks(self, enabled: bool = True):
+        """
+        Enables or disables computing the bottleneck of sequential adapters via ``Adapter.forward_fused_bottleneck()``.
+        """
+        self._fused_bottleneck = enabled
+        self._recompile_active()
+
+    def fold_fusion_for_eval(self, enabled: bool = True):
+        """
+        Enables or disables folding the key projections of the fusion layers of this layer into the up-projections of
+        the fused adapters in evaluation mode (see ``BertFusion.fold_key_projection()``).
+        """
+        self._fold_fusion = enabled
+        self._recompile_active()
+
+    def quantize_adapters(self, dtype=torch.qint8):
+        """
+        Replaces the down- and up-projections of all bottleneck adapters of this layer with dynamically quantized
+        linear layers of the given dtype (see ``torch.quantization.quantize_dynamic()``). This can't be undone.
+        """
+        from torch.quantization import float16_dynamic_qconfig, per_channel_dynamic_qconfig, quantize_dynamic
+
+        if dtype == torch.qint8:
+            qconfig = per_channel_dynamic_qconfig
+        elif dtype == torch.float16:
+            qconfig = float16_dynamic_qconfig
+        else:
+            raise ValueError("Unsupported dtype for adapter quantization: {}".format(dtype))
+        if any(param.device.type != "cpu" for param in self.adapters.parameters()):
+            raise ValueError("Dynamically quantized adapters only run on CPU. Please move the adapters to CPU first.")
+        for adapter in self.adapters.values():
+            quantize_dynamic(adapter, {"adapter_down.0": qconfig, "adapter_up": qconfig}, dtype=dtype, inplace=True)
+        self._recompile_active()
+
+    def _recompile_active(self):
+        """
+        Resets all state derived from the added and active adapters. Called whenever adapters are added, deleted or
+        (de-)activated.
+        """
+        self._compiled_setup = None
+        self._compiled_adapters = None
+        self._compiled_plan = None
+        self._has_active_adapter_setup = None
+        self._grouped_weights = {}
+        self._state_version = next(_STATE_VERSIONS)
+        self._reset_fused()
+
+    def _contains_active_adapter(self, module_dict, adapter_setup):
+        # cached until the adapter setup or the adapters of this layer change
+        if adapter_setup is not self._has_active_adapter_setup:
+            self._has_active_adapter = super()._contains_active_adapter(module_dict, adapter_setup)
+            self._has_active_adapter_setup = adapter_setup
+        return self._has_active_adapter
+
+    def _reset_fused(self):
+        self._traced_adapter = None
+        for adapter in self.adapters.values():
+            adapter._fused_down = None
+        for fusion_layer in self.adapter_fusion_layer.values():
+            fusion_layer._key_fold = None
+
+    def __getstate__(self):
+        # traced modules can't be pickled, they are re-created on demand
+        state = self.__dict__.copy()
+        state["_traced_adapter"] = None
+        state["_grouped_weights"] = {}
+        return state
+
+    def _get_fused_adapter(self, adapter_setup, hidden_states, layer_norm):
+        """
+        Returns the adapter module to be computed via the fused inference path or None if the fused path can't be used
+        for the given setup.
+        """
+        if self.training:
+            # weights might be updated, so fold them again once we're back in evaluation mode
+            self._reset_fused()
+            return None
+        if is_stream_capturing(hidden_states):
+            return None
+        # the fused path requires a stack of a single adapter which is part of this module
+        op, plan, _ = self._get_compiled_plan(adapter_setup)
+        if op != STACK or len(plan[1]) != 1 or plan[1][0][0] != RUN_ADAPTER:
+            return None
+        adapter = plan[1][0][1][1]
+        fused_down = adapter._fused_down
+        if (
+            fused_down is None
+            or fused_down[0].device != hidden_states.device
+            or fused_down[0].dtype != hidden_states.dtype
+        ):
+            self._traced_adapter = None
+            if not adapter.fold_layer_norm(layer_norm):
+                return None
+        return adapter
+
+    def _forward_traced(self, adapter, hidden_states, input_tensor, layer_norm):
+        """
+        Forwards the given input through the traced fused inference path of the given adapter. The adapter is traced
+        with the given input on the first call.
+        """
+        if self._traced_adapter is None or self._traced_adapter[0] is not adapter:
+            module = FusedAdapterForward(adapter, layer_norm)
+            with torch.no_grad():
+                traced = torch.jit.trace(module, (hidden_states, input_tensor), check_trace=False)
+            self._traced_adapter = (adapter, traced)
+        return self._traced_adapter[1](hidden_states, input_tensor)
+
+    def _compile_plan(self, adapter_setup, lvl=0):
+        """
+        Compiles the given adapter setup into an (op code, payload) tuple for this layer. The payloads of composition
+        blocks hold the compiled children together with direct references to the adapter modules, fusion layers and
+        configs used by the block, so that the forward pass doesn't need to walk the composition tree.
+        """
+        if isinstance(adapter_setup, str):
+            if adapter_setup in self.adapters:
+                adapter = self.adapters[adapter_setup]
+                if self._fused_bottleneck and adapter.supports_fused_bottleneck():
+                    adapter_forward = adapter.forward_fused_bottleneck
+                else:
+                    adapter_forward = adapter
+                # inference path without module calls (see Adapter.forward_fast())
+                fast_forward = adapter.forward_fast if adapter.supports_fused_bottleneck() else None
+                return RUN_ADAPTER, (
+                    adapter_setup,
+                    adapter,
+                    adapter_forward,
+                    adapter.get_pre_forward_fn(),
+                    fast_forward,
                 )
-            # Case 4: We have a nested batch split block -> call batchsplit method
-            elif isinstance(adapter_stack_layer, BatchSplit):
-                hidden_states = self.adapter_batchsplit(
-                    adapter_stack_layer, hidden_states, input_tensor, layer_norm, lvl=lvl + 1
+            # No adapter which is part of this module -> ignore
+            return SKIP, None
+        # Setups are validated by parse_composition() when activated, so nesting depth and allowed nestings are
+        # invariants here and need not be checked again.
+        op = PLAN_OPS[type(adapter_setup)]
+        children = tuple(self._compile_plan(child, lvl=lvl + 1) for child in adapter_setup)
+
+        if op == STACK:
+            # Outputs of intermediate single adapters of the top-level stack can be written into reused buffers.
+            # Nested stacks might run while the outputs of the outer stack are still needed, so they are excluded.
+            # The output of the last adapter which is part of this module is returned by the stack, so it is never
+            # buffered (blocks following it are skipped and pass it through).
+            buffered = None
+            if lvl == 0:
+                last_idx = max((i for i, (child_op, _) in enumerate(children) if child_op != SKIP), default=-1)
+                buffered = tuple(
+                    child_op == RUN_ADAPTER
+                    and child_plan[2] is child_plan[1]
+                    and child_plan[1].supports_output_buffer()
+                    for child_op, child_plan in children[:last_idx]
                 )
-            # Case 5: We have a single adapter which is part of this module -> forward pass
-            elif adapter_stack_layer in self.adapters:
-                adapter_layer = self.adapters[adapter_stack_layer]
-                hidden_states, _, residual = adapter_layer.pre_forward(hidden_states, input_tensor, layer_norm)
-                context = ForwardContext.get_context()
+                buffered = buffered if any(buffered) else None
+            return op, (adapter_setup, children, buffered)
+        elif op == FUSE:
+            # config of _last_ fused adapter is significant
+            fusion_config = self.config.adapters.get_fusion(adapter_setup.name)
+            pre_forward = self.adapters[adapter_setup.last()].get_pre_forward_fn(fusion_config)
+            if adapter_setup.name in self.adapter_fusion_layer:
+                fusion_layer = self.adapter_fusion_layer[adapter_setup.name]
+            else:
+                fusion_layer = None
+            # maximum number of adapter outputs to be fused in this layer
+            num_fused = sum(child_op != SKIP for child_op, _ in children)
+            # single adapters with compatible bottlenecks can be computed jointly
+            adapter_group = None
+            # the key projection of the fusion layer can be folded into the up-projections of single adapters
+            fold_adapters = None
+            if all(isinstance(child, str) for child in adapter_setup):
+                adapters = tuple(self.adapters[child] for child in adapter_setup if child in self.adapters)
+                if can_group_adapters(adapters):
+                    adapter_group = adapters
+                if self._fold_fusion and fusion_layer is not None and fusion_layer.supports_key_folding(adapters):
+                    fold_adapters = adapters
+            return op, (adapter_setup, children, pre_forward, fusion_layer, num_fused, adapter_group, fold_adapters)
+        elif op == SPLIT:
+            # config of _first_ of splitted adapters is significant
+            pre_forward = self.adapters[adapter_setup.first()].get_pre_forward_fn()
+            return op, (adapter_setup, children, pre_forward, adapter_setup.split_index)
+        elif op == PARALLEL:
+            # We assume all adapters have the same config
+            pre_forward = self.adapters[adapter_setup.first()].get_pre_forward_fn()
+            return op, (adapter_setup, children, pre_forward)
+        else:
+            pre_forward = self.adapters[adapter_setup.first()].get_pre_forward_fn()
+            # compute ids of sequences that should be passed to each adapter
+            offsets = np.cumsum([0] + list(adapter_setup.batch_sizes)).tolist()
+            batch_idx = tuple(zip(offsets[:-1], offsets[1:]))
+            return op, (adapter_setup, children, pre_forward, batch_idx)
+
+    def _get_compiled_plan(self, adapter_setup):
+        """
+        Returns the compiled plan of the given adapter setup together with the adapter used for post-processing.
+        Compiled plans are cached until the adapter setup or the adapters of this layer change.
+        """
+        # copies of this layer sharing its state (e.g. replicas of nn.DataParallel) hold their own adapter modules,
+        # so they must neither use the plan nor the cached weights of the original layer
+        if adapter_setup is not self._compiled_setup or self.adapters is not self._compiled_adapters:
+            op, plan = self._compile_plan(adapter_setup)
+            self._compiled_plan = (op, plan, self.adapters[adapter_setup.last()])
+            self._compiled_setup = adapter_setup
+            self._compiled_adapters = self.adapters
+            self._grouped_weights = {}
+        return self._compiled_plan
+
+    def _get_grouped_weights(self, adapters):
+        """
+        Returns the weights of the given grouped adapters as passed to ``grouped_adapter_bottleneck()``. Without
+        autograd, the stacked weights are cached until the adapters of this layer change or one of the weights is
+        modified. Otherwise, None is returned and the weights are stacked on each call.
+        """
+        if torch.is_grad_enabled() or is_stream_capturing(adapters[0].adapter_up.weight):
+            return None
+        params = [
+            param
+            for adapter in adapters
+            for param in (
+                adapter.adapter_down[0].weight,
+                adapter.adapter_down[0].bias,
+                adapter.adapter_up.weight,
+                adapter.adapter_up.bias,
+            )
+        ]
+        versions = tuple((param.data_ptr(), param._version) for param in params)
+        entry = self._grouped_weights.get(adapters, None)
+        if entry is None or entry[0] != versions:
+            entry = (versions, stack_adapter_weights(adapters))
+            # only a single entry per group, as the versions of the weights change with each update
+            self._grouped_weights[adapters] = entry
+        return entry[1]
+
+    def _forward_adapter(self, plan, hidden_states, input_tensor, layer_norm):
+        """
+        Forwards the given input through a single adapter which is part of this module.
+        """
+        adapter_name, adapter, adapter_layer, pre_forward, fast_forward = plan
+        hidden_states, _, residual = pre_forward(hidden_states, input_tensor, layer_norm)
+        context = ForwardContext.get_context()
+        down = self._get_cached_down(adapter_name, adapter, hidden_states, context)
+        if down is None:
+            if fast_forward is not None and not self.training and not adapter.has_forward_hooks():
+                layer_output = fast_forward(hidden_states, residual)
+            else:
                 layer_output = adapter_layer(
                     hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
                 )
-                hidden_states, up = layer_output[0], layer_output[2]
-                self._store_gating_score(adapter_stack_layer, layer_output[-1])
-                # as this stack might be part of a fusion block, return the adapter up-projection output here
-                # together with the final output (with potential residuals & norms) if we reached the last block of the stack
-                if i == len(adapter_setup) - 1:
-                    return hidden_states, up, input_tensor
-            # Case X: No adapter which is part of this module -> ignore
+        else:
+            layer_output = adapter(
+                hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores, down=down
+            )
+        self._store_gating_score(adapter_name, layer_output[-1])
+        return layer_output[0], layer_output[2], input_tensor
 
-        # If we got here, we either had another nested composition block
-        # or no adapter was found. In both cases, we don't need to set the second return value for fusion
+    def _get_cached_down(self, adapter_name, adapter, hidden_states, context):
+        """
+        Returns the bottleneck activations of the given adapter for the given input from the activation cache of the
+        current forward pass (see ``AdapterActivationCache``). The activations are computed and cached on a cache miss.
+        Returns None if no cache is set or the activations can't be cached.
+        """
+        cache = context.adapter_activation_cache
+        # only the activations of frozen computations can be reused
+        # (without autograd, inputs depending on trainable parameters can't be detected)
+        # the keys identify the examples of the full batch, so sub-batches (e.g. of BatchSplit blocks) are not cached
+        if (
+            cache is None
+            or len(context.adapter_activation_keys) != hidden_states.shape[0]
+            or not torch.is_grad_enabled()
+            or hidden_states.requires_grad
+            or any(param.requires_grad for param in adapter.adapter_down.parameters())
+        ):
+            return None
+        keys = [(key, self.layer_idx, self.location_key, adapter_name) for key in context.adapter_activation_keys]
+        down = cache.get(keys, hidden_states.device)
+        if down is None:
+            down = adapter.adapter_down(hidden_states)
+            cache.put(keys, down)
+        return down
+
+    def _forward_adapter_buffered(self, plan, hidden_states, input_tensor, layer_norm, buffer_idx):
+        """
+        Forwards the given input through a single adapter which is part of this module and writes the output into the
+        stack buffer with the given index. Returns the output and the up-projection output of the adapter.
+        """
+        adapter_name, adapter, _, pre_forward, _ = plan
+        hidden_states, _, residual = pre_forward(hidden_states, input_tensor, layer_norm)
+        # the buffers are held by the thread-local context of the current forward pass and shared by all layers
+        context = ForwardContext.get_context()
+        buffers = context.adapter_stack_buffers
+        buffer = buffers[buffer_idx]
+        if (
+            buffer is None
+            or buffer.shape != residual.shape
+            or buffer.dtype != residual.dtype
+            or buffer.device != residual.device
+        ):
+            buffer = torch.empty_like(residual)
+            buffers[buffer_idx] = buffer
+        layer_output = adapter(
+            hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores, out=buffer
+        )
+        self._store_gating_score(adapter_name, layer_output[-1])
+        return layer_output[0], layer_output[2]
+
+    def _forward_skip(self, plan, hidden_states, input_tensor, layer_norm):
+        """
+        Passes through the given input for adapters which are not part of this module.
+        """
         return hidden_states, None, input_tensor
 
-    def adapter_fusion(self, adapter_setup: Fuse, hidden_states, input_tensor, layer_norm, lvl=0):
+    def adapter_stack(self, plan, hidden_states, input_tensor, layer_norm):
         """
-        Performs adapter fusion with the given adapters for the given input.
+        Forwards the given input through the given (compiled) stack of adapters.
         """
+        _, children, buffered = plan
+        up = None
+        if buffered is None or torch.is_grad_enabled() or is_stream_capturing(hidden_states):
+            for op, child_plan in children:
+                hidden_states, up, input_tensor = getattr(self, PLAN_FORWARDS[op])(
+                    child_plan, hidden_states, input_tensor, layer_norm
+                )
+        else:
+            # Without autograd, intermediate outputs are not needed anymore once the next adapter is computed.
+            # Thus, two buffers are alternately reused for them. The output of the last adapter is never buffered.
+            buffer_idx = 0
+            for i, (op, child_plan) in enumerate(children):
+                if i < len(buffered) and buffered[i]:
+                    hidden_states, up = self._forward_adapter_buffered(
+                        child_plan, hidden_states, input_tensor, layer_norm, buffer_idx
+                    )
+                    buffer_idx = 1 - buffer_idx
+                else:
+                    hidden_states, up, input_tensor = getattr(self, PLAN_FORWARDS[op])(
+                        child_plan, hidden_states, input_tensor, layer_norm
+                    )
+        # as this stack might be part of a fusion block, return the adapter up-projection output here
+        # together with the final output (with potential residuals & norms) if the last block of the stack is an
+        # adapter
+        return hidden_states, up, input_tensor
+
+    def adapter_fusion(self, plan, hidden_states, input_tensor, layer_norm):
+        """
+        Performs adapter fusion with the given (compiled) adapters for the given input.
+        """
+        adapter_setup, children, pre_forward, fusion_layer, num_fused, adapter_group, fold_adapters = plan
         context = ForwardContext.get_context()
+        # grouped adapters are computed without module calls, so their hooks wouldn't be called
+        if adapter_group is not None and any(adapter.has_forward_hooks() for adapter in adapter_group):
+            adapter_group = None
 
         # config of _last_ fused adapter is significant
-        fusion_config = self.config.adapters.get_fusion(adapter_setup.name)
-        last_adapter = self.adapters[adapter_setup.last()]
-        hidden_states, query, residual = last_adapter.pre_forward(
-            hidden_states, input_tensor, layer_norm, fusion_config=fusion_config
-        )
-
-        up_list = []
+        hidden_states, query, residual = pre_forward(hidden_states, input_tensor, layer_norm)
+
+        fusion_output = None
+        # compute the keys from the adapter bottlenecks if the key projection is folded (see fold_fusion_for_eval())
+        if (
+            fold_adapters is not None
+            and not context.output_adapter_gating_scores
+            and context.adapter_activation_cache is None
+            and not is_stream_capturing(hidden_states)
+        ):
+            if self.training:
+                # weights might be updated, so fold them again once we're back in evaluation mode
+                fusion_layer._key_fold = None
+            else:
+                key_fold = fusion_layer._key_fold
+                if (
+                    key_fold is None
+                    or key_fold[0] is not fold_adapters
+                    or key_fold[1].device != hidden_states.device
+                    or key_fold[1].dtype != hidden_states.dtype
+                ):
+                    fusion_layer.fold_key_projection(fold_adapters)
+                if adapter_group is not None:
+                    down, up = grouped_adapter_bottleneck(
+                        adapter_group,
+                        hidden_states,
+                        output_down=True,
+                        weights=self._get_grouped_weights(adapter_group),
+                    )
+                else:
+                    layer_outputs = [adapter(hidden_states, residual_input=residual) for adapter in fold_adapters]
+                    down = torch.stack([layer_output[1] for layer_output in layer_outputs], dim=2)
+                    up = torch.stack([layer_output[2] for layer_output in layer_outputs], dim=2)
+                fusion_output = fusion_layer.forward_folded(
+                    query, down, up, residual, output_attentions=context.output_adapter_fusion_attentions
+                )
+                children = ()
+
+        # adapter outputs are written directly into a buffer of shape (batch, tokens, adapters, features)
+        up_buffer = None
+        num_up = 0
+        # compute all adapters at once if possible (gating scores are only stored if computed separately)
+        if (
+            fusion_output is None
+            and adapter_group is not None
+            and not context.output_adapter_gating_scores
+            and context.adapter_activation_cache is None
+        ):
+            up_buffer = grouped_adapter_bottleneck(
+                adapter_group, hidden_states, weights=self._get_grouped_weights(adapter_group)
+            )
+            num_up = num_fused
+            children = ()
 
-        for adapter_block in adapter_setup:
+        for op, child_plan in children:
             # Case 1: We have a nested stack -> call stack method
-            if isinstance(adapter_block, Stack):
-                _, up, _ = self.adapter_stack(adapter_block, hidden_states, input_tensor, layer_norm, lvl=lvl + 1)
-                if up is not None:  # could be none if stack is empty
-                    up_list.append(up)
+            if op == STACK:
+                _, up, _ = self.adapter_stack(child_plan, hidden_states, input_tensor, layer_norm)
+                if up is None:  # could be none if stack is empty
+                    continue
             # Case 2: We have a single adapter which is part of this module -> forward pass
-            elif adapter_block in self.adapters:
-                adapter_layer = self.adapters[adapter_block]
-                layer_output = adapter_layer(
-                    hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
-                )
-                up = layer_output[2]
-                self._store_gating_score(adapter_block, layer_output[-1])
-                up_list.append(up)
-            # Case 3: nesting other composition blocks is invalid
-            elif isinstance(adapter_block, AdapterCompositionBlock):
-                raise ValueError(
-                    "Invalid adapter setup. Cannot nest {} in {}".format(
-                        adapter_block.__class__.__name__, adapter_setup.__class__.__name__
+            elif op == RUN_ADAPTER:
+                adapter_name, adapter, adapter_layer, _, _ = child_plan
+                down = self._get_cached_down(adapter_name, adapter, hidden_states, context)
+                if down is None:
+                    layer_output = adapter_layer(
+                        hidden_states, residual_input=residual, output_gating=context.output_adapter_gating_scores
                     )
-                )
+                else:
+                    layer_output = adapter(
+                        hidden_states,
+                        residual_input=residual,
+                        output_gating=context.output_adapter_gating_scores,
+                        down=down,
+                    )
+                up = layer_output[2]
+                self._store_gating_score(adapter_name, layer_output[-1])
             # Case X: No adapter which is part of this module -> ignore
+            else:
+                continue
+
+            if up_buffer is None:
+                up_buffer = up.new_empty(up.shape[:2] + (num_fused,) + up.shape[2:])
+            up_buffer[:, :, num_up].copy_(up)
+            num_up += 1
 
-        if len(up_list) > 0:
-            up_list = torch.stack(up_list)
-            up_list = up_list.permute(1, 2, 0, 3)
+        if num_up > 0:
+            if num_up < num_fused:
+                up_buffer = up_buffer[:, :, :num_up]
 
-            fusion_output = self.adapter_fusion_layer[adapter_setup.name](
+            # key and value share the same tensor, as residual_before fusion adds the residual to it in-place
+            fusion_output = fusion_layer(
                 query,
-                up_list,
-                up_list,
+                up_buffer,
+                up_buffer,
                 residual,
                 output_attentions=context.output_adapter_fusion_attentions,
             )
+
+        if fusion_output is not None:
             if context.output_adapter_fusion_attentions:
                 hidden_states = fusion_output[0]
                 self._store_fusion_attentions(adapter_setup.name, fusion_output[-1])
             else:
                 hidden_states = fusion_output
 
-        return hidden_states
+        return hidden_states, None, input_tensor
 
-    def adapter_split(self, adapter_setup: Split, hidden_states, input_tensor, layer_norm, lvl=0):
+    def adapter_split(self, plan, hidden_states, input_tensor, layer_norm):
         """
-        Splits the given input between the given adapters.
+        Splits the given input between the given (compiled) adapters.
         """
+        _, children, pre_forward, split_index = plan
+        context = ForwardContext.get_context()
         # config of _first_ of splitted adapters is significant
-        first_adapter = self.adapters[adapter_setup.first()]
-        hidden_states, query, residual = first_adapter.pre_forward(hidden_states, input_tensor, layer_norm)
+        hidden_states, query, residual = pre_forward(hidden_states, input_tensor, layer_norm)
 
         # split hidden representations and residuals at split index
         split_hidden_states = [
-            hidden_states[:, : adapter_setup.split_index, :],
-            hidden_states[:, adapter_setup.split_index :, :],
+            hidden_states[:, :split_index, :],
+            hidden_states[:, split_index:, :],
         ]
         split_input_tensor = [
-            input_tensor[:, : adapter_setup.split_index, :],
-            input_tensor[:, adapter_setup.split_index :, :],
+            input_tensor[:, :split_index, :],
+            input_tensor[:, split_index:, :],
         ]
         split_residual = [
-            residual[:, : adapter_setup.split_index, :],
-            residual[:, adapter_setup.split_index :, :],
+            residual[:, :split_index, :],
+            residual[:, split_index:, :],
         ]
-
-        for i, adapter_block in enumerate(adapter_setup):
-            # Case 1: We have a nested stack -> call stack method
-            if isinstance(adapter_block, Stack):
-                split_hidden_states[i], _, _ = self.adapter_stack(
-                    adapter_block, split_hidden_states[i], split_input_tensor[i], layer_norm, lvl=lvl + 1
-                )
-            # Case 2: We have a nested split -> recursively call split
-            elif isinstance(adapter_block, Split):
-                split_hidden_states[i] = self.adapter_split(
-                    adapter_block, split_hidden_states[i], split_input_tensor[i], layer_norm, lvl=lvl + 1
-                )
-            # Case 3: We have a nested batch split -> call batch split method
-            elif isinstance(adapter_block, BatchSplit):
-                split_hidden_states[i] = self.adapter_batchsplit(
-                    adapter_block, split_hidden_states[i], split_input_tensor[i], layer_norm, lvl=lvl + 1
-                )
-            # Case 4: We have a single adapter which is part of this module -> forward pass
-            elif adapter_block in self.adapters:
-                adapter_layer = self.adapters[adapter_block]
-                context = ForwardContext.get_context()
+        # outputs of both splits are written directly into the respective slices of the output tensor
+        # (views are created right before writing, as views created earlier would not track gradients correctly)
+        output = torch.empty_like(hidden_states)
+        split_slices = [slice(None, split_index), slice(split_index, None)]
+
+        for i, (op, child_plan) in enumerate(children):
+            # Case 1: We have a single adapter which is part of this module -> forward pass
+            if op == RUN_ADAPTER:
+                adapter_name, _, adapter_layer, _, _ = child_plan
                 layer_output = adapter_layer(
                     split_hidden_states[i],
                     residual_input=split_residual[i],
                     output_gating=context.output_adapter_gating_scores,
+                    return_intermediate=False,
                 )
-                split_hidden_states[i] = layer_output[0]
-                self._store_gating_score(adapter_block, layer_output[-1])
-            # Case 5: nesting other composition blocks is invalid
-            elif isinstance(adapter_block, AdapterCompositionBlock):
-                raise ValueError(
-                    "Invalid adapter setup. Cannot nest {} in {}".format(
-                        adapter_block.__class__.__name__, adapter_setup.__class__.__name__
-                    )
+                output[:, split_slices[i], :].copy_(layer_output[0])
+                self._store_gating_score(adapter_name, layer_output[-1])
+            # Case 2: We have a nested stack, split or batch split -> call the respective method
+            elif op != SKIP:
+                child_hidden_states, _, _ = getattr(self, PLAN_FORWARDS[op])(
+                    child_plan, split_hidden_states[i], split_input_tensor[i], layer_norm
                 )
+                output[:, split_slices[i], :].copy_(child_hidden_states)
             # Case X: No adapter which is part of this module -> ignore
+            else:
+                output[:, split_slices[i], :].copy_(split_hidden_states[i])
 
-        hidden_states = torch.cat(split_hidden_states, dim=1)
-        return hidden_states
+        return output, None, input_tensor
 
-    def adapter_parallel(self, adapter_setup: Parallel, hidden_states, input_tensor, layer_norm, lvl=0):
+    def adapter_parallel(self, plan, hidden_states, input_tensor, layer_norm):
         """
         For parallel execution of the adapters on the same input. This means that the input is repeated N times before
         feeding it to the adapters (where N is the number of adapters).
         """
+        adapter_setup, children, pre_forward = plan
 
         context = ForwardContext.get_context()
         if not context.adapters_parallelized:
@@ -386,160 +821,105 @@ class AdapterLayer(AdapterLayerBase, nn.Module):
             orig_batch_size = hidden_states.shape[0] // adapter_setup.parallel_channels
 
         # We assume all adapters have the same config
-        first_adapter = self.adapters[adapter_setup.first()]
-        hidden_states, _, residual = first_adapter.pre_forward(hidden_states, input_tensor, layer_norm)
+        hidden_states, _, residual = pre_forward(hidden_states, input_tensor, layer_norm)
 
         # sequentially feed different parts of the blown-up batch into different adapters
         children_hidden = []
-        for i, child in enumerate(adapter_setup):
-            # Case 1: We have a nested stack -> call stack method
-            if isinstance(child, Stack):
-                child_hidden_states, _, _ = self.adapter_stack(
-                    child,
-                    hidden_states[i * orig_batch_size : (i + 1) * orig_batch_size],
-                    input_tensor[i * orig_batch_size : (i + 1) * orig_batch_size],
-                    layer_norm,
-                    lvl=lvl + 1,
-                )
-                children_hidden.append(child_hidden_states)
-            # Case 2. We have a nested batchsplit block -> call batchsplit method
-            elif isinstance(child, BatchSplit):
-                child_hidden_states = self.adapter_batchsplit(
-                    child,
-                    hidden_states[i * orig_batch_size : (i + 1) * orig_batch_size],
-                    input_tensor[i * orig_batch_size : (i + 1) * orig_batch_size],
-                    layer_norm,
-                    lvl=lvl + 1,
-                )
-                children_hidden.append(child_hidden_states)
-            # Case 3: We have a single adapter which is part of this module -> forward pass
-            elif child in self.adapters:
-                adapter_layer = self.adapters[child]
-                context = ForwardContext.get_context()
+        for i, (op, child_plan) in enumerate(children):
+            # Case 1: We have a single adapter which is part of this module -> forward pass
+            if op == RUN_ADAPTER:
+                adapter_name, _, adapter_layer, _, _ = child_plan
                 layer_output = adapter_layer(
                     hidden_states[i * orig_batch_size : (i + 1) * orig_batch_size],
                     residual_input=residual[i * orig_batch_size : (i + 1) * orig_batch_size],
                     output_gating=context.output_adapter_gating_scores,
+                    return_intermediate=False,
                 )
                 child_hidden_states = layer_output[0]
-                self._store_gating_score(child, layer_output[-1])
+                self._store_gating_score(adapter_name, layer_output[-1])
                 children_hidden.append(child_hidden_states)
-            # Case 4: nesting other composition blocks is invalid
-            elif isinstance(child, AdapterCompositionBlock):
-                raise ValueError(
-                    "Invalid adapter setup. Cannot nest {} in {}".format(
-                        child.__class__.__name__, adapter_setup.__class__.__name__
-                    )
+            # Case 2: We have a nested stack or batch split -> call the respective method
+            elif op != SKIP:
+                child_hidden_states, _, _ = getattr(self, PLAN_FORWARDS[op])(
+                    child_plan,
+                    hidden_states[i * orig_batch_size : (i + 1) * orig_batch_size],
+                    input_tensor[i * orig_batch_size : (i + 1) * orig_batch_size],
+                    layer_norm,
                 )
+                children_hidden.append(child_hidden_states)
             # Case X: No adapter which is part of this module -> ignore
             else:
                 children_hidden.append(hidden_states[i * orig_batch_size : (i + 1) * orig_batch_size])
 
         # concatenate all outputs and return
         hidden_states = torch.cat(children_hidden, 0)
-        return hidden_states, input_tensor
+        return hidden_states, None, input_tensor
 
-    def adapter_batchsplit(self, adapter_setup: BatchSplit, hidden_states, input_tensor, layer_norm, lvl=0):
-        if not sum(adapter_setup.batch_sizes) == hidden_states.shape[0]:
+    def adapter_batchsplit(self, plan, hidden_states, input_tensor, layer_norm):
+        adapter_setup, children, pre_forward, batch_idx = plan
+        context = ForwardContext.get_context()
+        if not batch_idx[-1][1] == hidden_states.shape[0]:
             raise IndexError(
                 "The given batch has a size of {} which is not compatible with batch_sizes {}".format(
                     hidden_states.shape[0], adapter_setup.batch_sizes
                 )
             )
 
-        first_adapter = self.adapters[adapter_setup.first()]
-        hidden_states, _, residual = first_adapter.pre_forward(hidden_states, input_tensor, layer_norm)
+        hidden_states, _, residual = pre_forward(hidden_states, input_tensor, layer_norm)
         children_hidden = []
-        for i, adapter_block in enumerate(adapter_setup):
-            # compute ids of sequences thet should be passed to the ith adapter
-            batch_idx = (
-                sum(adapter_setup.batch_sizes[:i]),
-                sum(adapter_setup.batch_sizes[: i + 1]),
-            )
-            # Case 1: We have a nested stack -> call stack method
-            if isinstance(adapter_block, Stack):
-                child, _, _ = self.adapter_stack(
-                    adapter_block,
-                    hidden_states[batch_idx[0] : batch_idx[1]],
-                    input_tensor[batch_idx[0] : batch_idx[1]],
-                    layer_norm,
-                    lvl=lvl + 1,
-                )
-                children_hidden.append(child)
-            # Case 2: We have a nested split -> recursively call split
-            elif isinstance(adapter_block, Split):
-                child = self.adapter_split(
-                    adapter_block,
-                    hidden_states[batch_idx[0] : batch_idx[1]],
-                    input_tensor[batch_idx[0] : batch_idx[1]],
-                    layer_norm,
-                    lvl=lvl + 1,
-                )
-                children_hidden.append(child)
-            # Case 3: We have a nested batch split block -> call batchsplit method
-            elif isinstance(adapter_block, BatchSplit):
-                child = self.adapter_batchsplit(
-                    adapter_block,
-                    hidden_states[batch_idx[0] : batch_idx[1]],
-                    input_tensor[batch_idx[0] : batch_idx[1]],
-                    layer_norm,
-                    lvl=lvl + 1,
-                )
-                children_hidden.append(child)
-            # Case 4: We have a single adapter which is part of this module -> forward pass
-            elif adapter_block in self.adapters:
-
-                adapter_layer = self.adapters[adapter_block]
-                context = ForwardContext.get_context()
+        for (op, child_plan), (start, end) in zip(children, batch_idx):
+            # Case 1: We have a single adapter which is part of this module -> forward pass
+            if op == RUN_ADAPTER:
+                adapter_name, _, adapter_layer, _, _ = child_plan
                 layer_output = adapter_layer(
-                    hidden_states[batch_idx[0] : batch_idx[1]],
-                    residual_input=residual[batch_idx[0] : batch_idx[1]],
+                    hidden_states[start:end],
+                    residual_input=residual[start:end],
                     output_gating=context.output_adapter_gating_scores,
+                    return_intermediate=False,
                 )
                 children_hidden.append(layer_output[0])
-                self._store_gating_score(adapter_block, layer_output[-1])
-            # Case 5: nesting other composition blocks is invalid
-            elif isinstance(adapter_block, AdapterCompositionBlock):
-                raise ValueError(
-                    "Invalid adapter setup. Cannot nest {} in {}".format(
-                        adapter_block.__class__.__name__, adapter_setup.__class__.__name__
-                    )
+                self._store_gating_score(adapter_name, layer_output[-1])
+            # Case 2: We have a nested stack, split or batch split -> call the respective method
+            elif op != SKIP:
+                child, _, _ = getattr(self, PLAN_FORWARDS[op])(
+                    child_plan, hidden_states[start:end], input_tensor[start:end], layer_norm
                 )
+                children_hidden.append(child)
             # Case X: No adapter which is part of this module -> ignore
             else:
-                children_hidden.append(hidden_states[batch_idx])
+                children_hidden.append(hidden_states[start:end])
 
         hidden_states = torch.cat(children_hidden, 0)
-        return hidden_states
+        return hidden_states, None, input_tensor
 
     def adapter_layer_forward(self, hidden_states, input_tensor, layer_norm):
         """
         Called for each forward pass through adapters.
         """
         adapter_setup = self.get_active_setup(self.adapters)
-        if adapter_setup is not None:
+        fused_adapter = None
+        if adapter_setup is not None and self._eval_fused:
+            fused_adapter = self._get_fused_adapter(adapter_setup, hidden_states, layer_norm)
+
+        if fused_adapter is not None and self._eval_traced:
+            hidden_states = self._forward_traced(fused_adapter, hidden_states, input_tensor, layer_norm)
+
+        elif fused_adapter is not None:
             input_hidden_states = hidden_states
+            hidden_states, _, _ = fused_adapter.forward_fused(hidden_states, input_tensor, layer_norm)
+            hidden_states = fused_adapter.post_forward(hidden_states, input_hidden_states, input_tensor, layer_norm)
 
-            if isinstance(adapter_setup, Stack):
-                hidden_states, _, input_tensor = self.adapter_stack(
-                    adapter_setup, hidden_states, input_tensor, layer_norm
-                )
-            elif isinstance(adapter_setup, Fuse):
-                hidden_states = self.adapter_fusion(adapter_setup, hidden_states, input_tensor, layer_norm)
-            elif isinstance(adapter_setup, Split):
-                hidden_states = self.adapter_split(adapter_setup, hidden_states, input_tensor, layer_norm)
-            elif isinstance(adapter_setup, Parallel):
-                # notice that we are overriding input tensor here to keep the same dim as hidden_states for the residual
-                # in case we were blowing up the batch for parallel processing of multiple adapters for the same input
-                hidden_states, input_tensor = self.adapter_parallel(
-                    adapter_setup, hidden_states, input_tensor, layer_norm
-                )
-            elif isinstance(adapter_setup, BatchSplit):
-                hidden_states = self.adapter_batchsplit(adapter_setup, hidden_states, input_tensor, layer_norm)
-            else:
-                raise ValueError(f"Invalid adapter setup {adapter_setup}")
+        elif adapter_setup is not None:
+            input_hidden_states = hidden_states
+
+            op, plan, last_adapter = self._get_compiled_plan(adapter_setup)
+            # notice that parallel blocks override the input tensor here to keep the same dim as hidden_states for the
+            # residual in case we were blowing up the batch for parallel processing of multiple adapters for the same
+            # input
+            hidden_states, _, input_tensor = getattr(self, PLAN_FORWARDS[op])(
+                plan, hidden_states, input_tensor, layer_norm
+            )
 
-            last_adapter = self.adapters[adapter_setup.last()]
             hidden_states = last_adapter.post_forward(hidden_states, input_hidden_states, input_tensor, layer_norm)
 
         elif layer_norm:
@@ -1,8 +1,11 @@
 import logging
-from typing import Iterable, Tuple
+from typing import Iterable, List, Tuple
 
+import torch
 import torch.nn as nn
 
+from ...pytorch_utils import apply_chunking_to_forward
+from ..context import AdapterSetup, ForwardContext
 from ..layer import AdapterLayer
 from ..model_mixin import InvertibleAdaptersMixin, ModelAdaptersMixin, EmbeddingAdaptersMixin
 
@@ -26,9 +29,166 @@ class ElectraOutputAdaptersMixin(AdapterLayer):
         super().__init__("output_adapter", None)
 
 
+def _forward_post_attention(layer, context_layer, hidden_states):
+    attention_output = layer.attention.output(context_layer, hidden_states)
+    return apply_chunking_to_forward(
+        layer.feed_forward_chunk, layer.chunk_size_feed_forward, layer.seq_len_dim, attention_output
+    )
+
+
+def _adapter_state_versions(layer):
+    return layer.attention.output._state_version, layer.output._state_version
+
+
+def _layer_data_ptrs(layer):
+    return tuple(t.data_ptr() for t in layer.parameters()) + tuple(t.data_ptr() for t in layer.buffers())
+
+
+class PiecewiseLayerGraphs:
+    """
+    CUDA graphs of an encoder layer captured via ``capture_piecewise_graphs()``, which are replayed by the forward
+    method of the layer. CUDA graphs can't be copied or pickled, so copies of the layer run eagerly.
+    """
+
+    def __init__(self, layer_idx, graphs):
+        self.layer_idx = layer_idx
+        self.graphs = graphs
+
+    def forward(
+        self,
+        layer,
+        hidden_states,
+        attention_mask=None,
+        head_mask=None,
+        encoder_hidden_states=None,
+        encoder_attention_mask=None,
+        past_key_value=None,
+        output_attentions=False,
+    ):
+        """
+        Runs the self-attention of the given layer eagerly and replays the captured graph of the remaining layer.
+        Returns None if no graph can be used for the inputs, the layer is run eagerly then.
+        """
+        entry = self.graphs.get((self.layer_idx,) + tuple(hidden_states.shape[:2]), None)
+        if entry is not None and entry[0] != _adapter_state_versions(layer):
+            # adapters were added, deleted, (de-)activated or transformed since capturing
+            self.graphs.clear()
+            entry = None
+        context = ForwardContext.get_context()
+        if (
+            entry is None
+            or layer.training
+            or torch.is_grad_enabled()
+            or encoder_hidden_states is not None
+            or past_key_value is not None
+            or context is None
+            or getattr(context, "output_adapter_gating_scores", False)
+            or getattr(context, "output_adapter_fusion_attentions", False)
+            or AdapterSetup.get_context() is not None
+            or hidden_states.device != entry[2].device
+            or hidden_states.dtype != entry[2].dtype
+            # the graph reads the weights from the memory they had while capturing, which is freed if they are
+            # replaced (e.g. by moving the model or merging LoRA weights) and differs for replicas of nn.DataParallel
+            or entry[5] != _layer_data_ptrs(layer)
+        ):
+            return None
+
+        _, graph, static_hidden_states, static_context_layer, static_output, _ = entry
+        self_outputs = layer.attention.self(
+            hidden_states, attention_mask, head_mask, output_attentions=output_attentions
+        )
+        static_hidden_states.copy_(hidden_states)
+        static_context_layer.copy_(self_outputs[0])
+        graph.replay()
+        # the static output is overwritten by the next replay
+        return (static_output.clone(),) + self_outputs[1:]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["graphs"] = {}
+        return state
+
+
 class ElectraModelAdaptersMixin(EmbeddingAdaptersMixin, InvertibleAdaptersMixin, ModelAdaptersMixin):
     """Adds adapters to the Electra module."""
 
     def iter_layers(self) -> Iterable[Tuple[int, nn.Module]]:
-        for i, layer in enumerate(self.encoder.layer):
-            yield i, layer
\ No newline at end of file
+        # enumerated layers are cached and only rebuilt if the layer list was replaced or resized
+        layers = self.encoder.layer
+        cache = self.__dict__.get("_iter_layers_cache", None)
+        if cache is None or cache[0] is not layers or len(cache[1]) != len(layers):
+            cache = (layers, tuple(enumerate(layers)))
+            self._iter_layers_cache = cache
+        return iter(cache[1])
+
+    def capture_piecewise_graphs(self, batch_sizes: List[int], seq_len: int):
+        """
+        Captures CUDA graphs of all encoder layers for inference with the given input shapes. Per layer, the
+        computation following the self-attention (attention output projection, feed-forward block and all adapters) is
+        captured and replayed, while the self-attention itself is run eagerly. Thus, the graphs can be used with any
+        attention mask and with prefix tuning. For other input shapes, in training mode or if adapter gating scores or
+        fusion attentions are requested, layers fall back to eager execution. The same applies to copies of the model
+        (including replicas of ``nn.DataParallel``) and after the weights were moved to new memory (e.g. by
+        ``model.cpu()`` and ``model.cuda()``). All graphs are released once adapters are added, deleted, (de-)activated
+        or transformed and must be recaptured then. Previously captured graphs are released before capturing (see
+        ``release_piecewise_graphs()``).
+
+        Args:
+            batch_sizes (List[int]): The batch sizes for which graphs are captured.
+            seq_len (int): The sequence length for which graphs are captured.
+        """
+        if self.config.is_decoder:
+            raise ValueError("Piecewise CUDA graphs are only supported for encoder models.")
+        if self.has_parallel_adapters:
+            raise ValueError("Piecewise CUDA graphs are not supported for Parallel adapter setups.")
+        self.release_piecewise_graphs()
+        self._layer_graphs = {}
+        hidden_size = self.config.hidden_size
+        with torch.no_grad():
+            for batch_size in batch_sizes:
+                input_ids = torch.zeros((batch_size, seq_len), dtype=torch.long, device=self.device)
+                with ForwardContext(self, input_ids=input_ids):
+                    for i, layer in self.iter_layers():
+                        static_hidden_states = torch.zeros(
+                            (batch_size, seq_len, hidden_size), dtype=self.dtype, device=self.device
+                        )
+                        static_context_layer = torch.zeros(
+                            (batch_size, seq_len, layer.attention.self.all_head_size),
+                            dtype=self.dtype,
+                            device=self.device,
+                        )
+                        # warm up on a side stream before capturing, as recommended for CUDA graphs
+                        stream = torch.cuda.Stream()
+                        stream.wait_stream(torch.cuda.current_stream())
+                        with torch.cuda.stream(stream):
+                            for _ in range(3):
+                                _forward_post_attention(layer, static_context_layer, static_hidden_states)
+                        torch.cuda.current_stream().wait_stream(stream)
+                        graph = torch.cuda.CUDAGraph()
+                        with torch.cuda.graph(graph):
+                            static_output = _forward_post_attention(layer, static_context_layer, static_hidden_states)
+                        self._layer_graphs[(i, batch_size, seq_len)] = (
+                            _adapter_state_versions(layer),
+                            graph,
+                            static_hidden_states,
+                            static_context_layer,
+                            static_output,
+                            _layer_data_ptrs(layer),
+                        )
+        for i, layer in self.iter_layers():
+            layer.piecewise_graphs = PiecewiseLayerGraphs(i, self._layer_graphs)
+
+    def release_piecewise_graphs(self):
+        """
+        Releases all CUDA graphs captured via ``capture_piecewise_graphs()``.
+        """
+        for _, layer in self.iter_layers():
+            layer.__dict__.pop("piecewise_graphs", None)
+        self.__dict__.pop("_layer_graphs", None)
+
+    def __getstate__(self):
+        # CUDA graphs can't be copied or pickled, copies run eagerly
+        state = self.__dict__.copy()
+        if "_layer_graphs" in state:
+            state["_layer_graphs"] = {}
+        return state
@@ -1,3 +1,4 @@
+import inspect
 import logging
 import os
 import warnings
@@ -17,7 +18,7 @@ from .configuration import (
     AdapterFusionConfig,
     get_adapter_config_hash,
 )
-from .context import AdapterSetup, ForwardContext
+from .context import AdapterActivationCache, AdapterSetup, ForwardContext
 from .hub_mixin import PushAdapterToHubMixin
 from .layer import AdapterLayer, AdapterLayerBase
 from .loading import AdapterFusionLoader, AdapterLoader, PredictionHeadLoader, WeightsLoader
@@ -276,6 +277,12 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         else:
             self.model_name = None
         self.shared_parameters = nn.ModuleDict()
+        # value weights of all fusion layers, lazily collected for fusion regularization
+        self._fusion_value_weights = None
+        # cache of the bottleneck activations of frozen adapters (see set_adapter_activation_cache())
+        self._adapter_activation_cache = None
+        # identity matrix used as target of the fusion regularization, lazily created on the device of the weights
+        self._fusion_reg_target = None
 
         # Make sure config is wrapped
         self.config = wrap_config(self.config)
@@ -299,6 +306,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         # Initialize fusion from config
         for fusion_name in self.config.adapters.fusions:
             self.apply_to_adapter_layers(lambda i, layer: layer.add_fusion_layer(fusion_name))
+        self._fusion_value_weights = None
 
         if isinstance(self, EmbeddingAdaptersMixin):
             self.loaded_embeddings["default"] = self.get_input_embeddings()
@@ -405,6 +413,92 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         self.reset_adapter()
         self.config.adapters.active_setup = adapter_setup
         self.config.adapters.skip_layers = skip_layers
+        for _, layer in self.iter_layers():
+            for module in layer.modules():
+                if isinstance(module, AdapterLayer):
+                    module._recompile_active()
+
+    def eval_fused(self, enabled: bool = True, trace: bool = False):
+        """
+        Sets the model into evaluation mode and enables (or disables) the fused inference path for bottleneck adapters.
+        If enabled, the affine transformation of the Transformer LayerNorm before a single active adapter is folded
+        into the adapter down-projection. Folded weights are recomputed after adapters are added or (de-)activated.
+
+        Args:
+            enabled (bool, optional): Whether to enable the fused inference path. Defaults to True.
+            trace (bool, optional):
+                Whether to additionally trace the fused computation of each layer via ``torch.jit.trace`` on the first
+                forward pass. Defaults to False.
+        """
+        self.eval()
+        for _, layer in self.iter_layers():
+            for module in layer.modules():
+                if isinstance(module, AdapterLayer):
+                    module.eval_fused(enabled, trace=trace)
+
+    def fuse_adapter_bottlenecks(self, enabled: bool = True):
+        """
+        Enables (or disables) computing the bottleneck of sequential adapters as a single autograd operation. Instead
+        of storing the intermediate activations of the bottleneck for the backward pass, they are recomputed, which
+        reduces the memory required for training. Adapters with layer norms, gating or PHM layers are computed as
+        usual.
+
+        Args:
+            enabled (bool, optional): Whether to compute adapter bottlenecks as single operation. Defaults to True.
+        """
+        for _, layer in self.iter_layers():
+            for module in layer.modules():
+                if isinstance(module, AdapterLayer):
+                    module.fuse_adapter_bottlenecks(enabled)
+
+    def quantize_adapters(self, dtype=torch.qint8):
+        """
+        Sets the model into evaluation mode and quantizes the down- and up-projections of all bottleneck adapters for
+        inference. The weights are quantized to int8 with per-channel scales (or converted to float16), activations are
+        quantized dynamically. Quantized adapters can't be trained anymore and only run on CPU. Adapters with PHM
+        layers are only partially quantized.
+
+        Args:
+            dtype (torch.dtype, optional): The quantized dtype, either torch.qint8 or torch.float16.
+                Defaults to torch.qint8.
+        """
+        if any(param.device.type != "cpu" for param in self.parameters()):
+            raise ValueError(
+                "Dynamically quantized adapters only run on CPU. Please move the model to CPU first, e.g. via"
+                " model.to('cpu')."
+            )
+        self.eval()
+        for _, layer in self.iter_layers():
+            for module in layer.modules():
+                if isinstance(module, AdapterLayer):
+                    module.quantize_adapters(dtype)
+
+    def set_adapter_activation_cache(self, cache: Optional[AdapterActivationCache]):
+        """
+        Sets the cache used to store and reuse the bottleneck activations of frozen adapters across forward passes over
+        the same examples, e.g. in multiple epochs of AdapterFusion training. See ``AdapterActivationCache`` for
+        details.
+
+        Args:
+            cache (AdapterActivationCache): The cache to use. Set to None to disable caching.
+        """
+        self.base_model._adapter_activation_cache = cache
+
+    def fold_fusion_for_eval(self, enabled: bool = True):
+        """
+        Sets the model into evaluation mode and enables (or disables) folding the key projections of AdapterFusion
+        layers into the up-projections of the fused adapters. If enabled, the fusion keys of single adapters are
+        computed directly from their bottleneck activations. Folded weights are recomputed after adapters are added or
+        (de-)activated.
+
+        Args:
+            enabled (bool, optional): Whether to fold the key projections of fusion layers. Defaults to True.
+        """
+        self.eval()
+        for _, layer in self.iter_layers():
+            for module in layer.modules():
+                if isinstance(module, AdapterLayer):
+                    module.fold_fusion_for_eval(enabled)
 
     def add_adapter(self, adapter_name: str, config=None, overwrite_ok: bool = False, set_active: bool = False):
         """
@@ -498,6 +592,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             self.delete_adapter_fusion(adapter_names)
         self.config.adapters.add_fusion(adapter_names, config=config)
         self.apply_to_adapter_layers(lambda i, layer: layer.add_fusion_layer(adapter_names))
+        self._fusion_value_weights = None
         if set_active:
             if not isinstance(adapter_names, list):
                 adapter_names = adapter_names.split(",")
@@ -545,6 +640,7 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             return
         del self.config.adapters.fusions[adapter_fusion_name]
         self.apply_to_adapter_layers(lambda i, layer: layer.delete_fusion_layer(adapter_fusion_name))
+        self._fusion_value_weights = None
         # Reset active adapters if this was the active setup
         if self.active_adapters == adapter_names:
             self.active_adapters = None
@@ -781,6 +877,8 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
             return
 
         context.adapters_parallelized = False
+        # output buffers reused by the adapters of stacks without autograd (see AdapterLayer.adapter_stack())
+        context.adapter_stack_buffers = [None, None]
         # Add the shared parameters for the active adapters to the context
         context.shared_parameters = {
             name: param for name, param in self.shared_parameters.items() if name in active_adapters.flatten()
@@ -792,17 +890,53 @@ class ModelAdaptersMixin(PushAdapterToHubMixin, ABC):
         context.output_adapter_fusion_attentions = kwargs.get("output_adapter_fusion_attentions", False)
         context.adapter_gating_scores = defaultdict(dict)
         context.adapter_fusion_attentions = defaultdict(dict)
+        # Examples of the batch are identified by their inputs for caching adapter activations
+        context.adapter_activation_cache = getattr(self.base_model, "_adapter_activation_cache", None)
+        if context.adapter_activation_cache is not None:
+            # map positional arguments to the parameter names of the wrapped forward method
+            inputs = dict(zip(inspect.signature(self.forward).parameters, args))
+            inputs.update(kwargs)
+            if inputs.get("input_ids", None) is None:
+                context.adapter_activation_cache = None
+            else:
+                context.adapter_activation_keys = context.adapter_activation_cache.get_example_keys(
+                    *(
+                        inputs.get(name, None)
+                        for name in (
+                            "input_ids",
+                            "attention_mask",
+                            "token_type_ids",
+                            "position_ids",
+                            "decoder_input_ids",
+                            "decoder_attention_mask",
+                        )
+                    )
+                )
 
     def get_fusion_regularization_loss(self):
-        reg_loss = 0.0
-
-        target = torch.zeros((self.config.hidden_size, self.config.hidden_size)).fill_diagonal_(1.0).to(self.device)
-        for i, layer in self.iter_layers():
-            for module in layer.modules():
-                if isinstance(module, AdapterLayer):
-                    for _, layer_fusion in module.adapter_fusion_layer.items():
-                        if hasattr(layer_fusion, "value"):
-                            reg_loss += 0.01 * (target - layer_fusion.value.weight).pow(2).sum()
+        if self._fusion_value_weights is None:
+            self._fusion_value_weights = []
+            for i, layer in self.iter_layers():
+                for module in layer.modules():
+                    if isinstance(module, AdapterLayer):
+                        for _, layer_fusion in module.adapter_fusion_layer.items():
+                            if hasattr(layer_fusion, "value"):
+                                self._fusion_value_weights.append(layer_fusion.value.weight)
+        if len(self._fusion_value_weights) == 0:
+            return 0.0
+
+        # compute the loss for all value matrices at once
+        weights = torch.stack(self._fusion_value_weights)
+        target = self._fusion_reg_target
+        if (
+            target is None
+            or target.shape[-1] != weights.shape[-1]
+            or target.device != weights.device
+            or target.dtype != weights.dtype
+        ):
+            target = torch.eye(weights.shape[-1], device=weights.device, dtype=weights.dtype)
+            self._fusion_reg_target = target
+        reg_loss = 0.01 * (target - weights).pow(2).sum()
 
         return reg_loss
 
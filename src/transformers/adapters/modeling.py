@@ -16,6 +16,7 @@ class Activation_Function_Class(nn.Module):
 
     def __init__(self, hidden_act):
         super().__init__()
+        self.hidden_act = hidden_act.lower()
         if hidden_act.lower() == "leakyrelu":
             self.f = nn.functional.leaky_relu
         else:
@@ -25,6 +26,136 @@ class Activation_Function_Class(nn.Module):
         return self.f(x)
 
 
+# Specialized variants of Adapter.pre_forward()
+
+
+def _original_ln(hidden_states, input_tensor, layer_norm):
+    if layer_norm:
+        return layer_norm(hidden_states + input_tensor)
+    else:
+        return hidden_states + input_tensor
+
+
+def _pre_forward_no_ln(hidden_states, input_tensor, layer_norm):
+    return hidden_states, None, hidden_states
+
+
+def _pre_forward_no_ln_query(hidden_states, input_tensor, layer_norm):
+    return hidden_states, hidden_states, hidden_states
+
+
+def _pre_forward_ln(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, None, output
+
+
+def _pre_forward_ln_query_after(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, output, output
+
+
+def _pre_forward_ln_query_before(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, hidden_states, output
+
+
+def _pre_forward_ln_residual_before(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, None, hidden_states
+
+
+def _pre_forward_ln_residual_before_query_after(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, output, hidden_states
+
+
+def _pre_forward_ln_residual_before_query_before(hidden_states, input_tensor, layer_norm):
+    output = _original_ln(hidden_states, input_tensor, layer_norm)
+    return output, hidden_states, hidden_states
+
+
+# Bits of the keys of PRE_FORWARD_VARIANTS
+PRE_FORWARD_RESIDUAL_BEFORE_LN = 1
+PRE_FORWARD_ORIGINAL_LN_BEFORE = 2
+PRE_FORWARD_QUERY_BEFORE_LN = 4
+PRE_FORWARD_FUSION = 8
+
+
+def _select_pre_forward_variant(key):
+    if not key & PRE_FORWARD_ORIGINAL_LN_BEFORE:
+        # hidden states are passed through, so the position of residual & query doesn't matter
+        return _pre_forward_no_ln_query if key & PRE_FORWARD_FUSION else _pre_forward_no_ln
+    if key & PRE_FORWARD_RESIDUAL_BEFORE_LN:
+        if not key & PRE_FORWARD_FUSION:
+            return _pre_forward_ln_residual_before
+        elif key & PRE_FORWARD_QUERY_BEFORE_LN:
+            return _pre_forward_ln_residual_before_query_before
+        else:
+            return _pre_forward_ln_residual_before_query_after
+    else:
+        if not key & PRE_FORWARD_FUSION:
+            return _pre_forward_ln
+        elif key & PRE_FORWARD_QUERY_BEFORE_LN:
+            return _pre_forward_ln_query_before
+        else:
+            return _pre_forward_ln_query_after
+
+
+# Maps a bit mask of the adapter & fusion config values relevant for pre_forward() to a specialized function taking
+# (hidden_states, input_tensor, layer_norm) and returning (hidden_states, query, residual).
+PRE_FORWARD_VARIANTS = tuple(_select_pre_forward_variant(key) for key in range(16))
+
+
+class FusedAdapterFunction(torch.autograd.Function):
+    """
+    Computes the bottleneck of a sequential adapter, i.e. down-projection, non-linearity, up-projection, scaling and
+    residual connection, as a single autograd operation. Only the inputs are saved for the backward pass, the
+    intermediate activations are recomputed instead (similar to activation checkpointing).
+    """
+
+    @staticmethod
+    def forward(ctx, x, residual_input, down_weight, down_bias, up_weight, up_bias, non_linearity, scaling):
+        ctx.non_linearity = non_linearity
+        ctx.scaling = scaling
+        ctx.save_for_backward(x, down_weight, down_bias, up_weight, up_bias)
+
+        down = non_linearity(nn.functional.linear(x, down_weight, down_bias))
+        up = nn.functional.linear(down, up_weight, up_bias) * scaling
+        output = up + residual_input
+
+        return output, up
+
+    @staticmethod
+    def backward(ctx, grad_output, grad_up):
+        x, down_weight, down_bias, up_weight, up_bias = ctx.saved_tensors
+        # recompute the intermediate activations
+        with torch.enable_grad():
+            hidden = nn.functional.linear(x.detach(), down_weight.detach(), down_bias.detach()).requires_grad_()
+            down = ctx.non_linearity(hidden)
+
+        # gradient w.r.t. the unscaled up-projection
+        grad_up = (grad_output + grad_up) * ctx.scaling
+        (grad_hidden,) = torch.autograd.grad(down, hidden, grad_up.matmul(up_weight))
+
+        grad_up_flat = grad_up.reshape(-1, grad_up.size(-1))
+        grad_hidden_flat = grad_hidden.reshape(-1, grad_hidden.size(-1))
+        grads = [None] * 8
+        if ctx.needs_input_grad[0]:
+            grads[0] = grad_hidden.matmul(down_weight)
+        if ctx.needs_input_grad[1]:
+            grads[1] = grad_output
+        if ctx.needs_input_grad[2]:
+            grads[2] = grad_hidden_flat.t().mm(x.reshape(-1, x.size(-1)))
+        if ctx.needs_input_grad[3]:
+            grads[3] = grad_hidden_flat.sum(0)
+        if ctx.needs_input_grad[4]:
+            grads[4] = grad_up_flat.t().mm(down.detach().reshape(-1, down.size(-1)))
+        if ctx.needs_input_grad[5]:
+            grads[5] = grad_up_flat.sum(0)
+
+        return tuple(grads)
+
+
 # Single Adapter
 
 
@@ -108,6 +239,9 @@ class Adapter(nn.Module):
         if self.use_gating:
             self.gate = nn.Linear(self.input_size, 1)
 
+        # down-projection weights with a folded layer norm, only used for inference (see fold_layer_norm())
+        self._fused_down = None
+
         # if we want to initialize with the bert strategy then this function is called for all the linear layers
         if config["init_weights"] == "bert":
             self.adapter_down.apply(self.init_bert_weights)
@@ -143,30 +277,34 @@ class Adapter(nn.Module):
         Returns: hidden_states, query, residual
 
         """
-        query = None
+        return self.get_pre_forward_fn(fusion_config)(hidden_states, input_tensor, layer_norm)
 
+    def get_pre_forward_fn(self, fusion_config=None):
+        """
+        Returns a version of ``pre_forward()`` specialized to the configuration of this adapter and the given fusion
+        config. The returned function takes (hidden_states, input_tensor, layer_norm) as arguments.
+        """
+        key = 0
         if self.residual_before_ln:
-            residual = hidden_states
-
-        if fusion_config is not None and fusion_config["query_before_ln"]:
-            query = hidden_states
-
+            key |= PRE_FORWARD_RESIDUAL_BEFORE_LN
         if self.original_ln_before:
-            if layer_norm:
-                hidden_states = layer_norm(hidden_states + input_tensor)
-            else:
-                hidden_states = hidden_states + input_tensor
-
-        if not self.residual_before_ln:
-            residual = hidden_states
-
-        if fusion_config is not None and not fusion_config["query_before_ln"]:
-            query = hidden_states
+            key |= PRE_FORWARD_ORIGINAL_LN_BEFORE
+        if fusion_config is not None:
+            key |= PRE_FORWARD_FUSION
+            if fusion_config["query_before_ln"]:
+                key |= PRE_FORWARD_QUERY_BEFORE_LN
+        return PRE_FORWARD_VARIANTS[key]
 
-        return hidden_states, query, residual
+    def forward(self, x, residual_input, output_gating=False, out=None, return_intermediate=True, down=None):
+        """
+        Forwards the given input through the adapter bottleneck and applies the residual connection. If given, the
+        precomputed output of the down-projection (down) is used instead of computing it from x.
 
-    def forward(self, x, residual_input, output_gating=False):
-        down = self.adapter_down(x)
+        Returns: output, down, up (and the gating score if output_gating is set). If return_intermediate is False, the
+        outputs of the down- and up-projection are omitted.
+        """
+        if down is None:
+            down = self.adapter_down(x)
 
         up = self.adapter_up(down)
         up = up * self.scaling
@@ -178,9 +316,10 @@ class Adapter(nn.Module):
             gate = torch.mean(gate, dim=1).unsqueeze(-1)
             output = output * gate
 
+        # the residual connection is the last operation, so its result can be written into a given output buffer
         # apply residual connection before layer norm if configured in this way
         if self.adapter_residual_before_ln:
-            output = output + residual_input
+            output = torch.add(output, residual_input, out=None if self.add_layer_norm_after else out)
 
         # apply layer norm if available
         if self.add_layer_norm_after:
@@ -188,12 +327,132 @@ class Adapter(nn.Module):
 
         # if residual should be applied after layer norm, apply it here
         if not self.adapter_residual_before_ln:
-            output = output + residual_input
+            output = torch.add(output, residual_input, out=out)
 
+        if not return_intermediate:
+            # don't hold references to intermediate outputs not needed by the caller
+            return (output, gate) if self.use_gating and output_gating else (output,)
         if self.use_gating and output_gating:
             return output, down, up, gate
         return output, down, up
 
+    def supports_output_buffer(self):
+        """
+        Whether ``forward()`` can write its output into a preallocated buffer passed via ``out``. Only possible
+        without autograd.
+        """
+        return True
+
+    def supports_fused_bottleneck(self):
+        """
+        Whether the bottleneck of this adapter can be computed via ``forward_fused_bottleneck()``.
+        """
+        return (
+            len(self.adapter_down) == 2
+            and isinstance(self.adapter_down[0], nn.Linear)
+            and isinstance(self.adapter_up, nn.Linear)
+            and isinstance(self.scaling, float)
+            and not self.add_layer_norm_after
+            and not self.use_gating
+        )
+
+    def has_forward_hooks(self):
+        """
+        Whether forward hooks are registered on this adapter or one of the modules used by ``forward_fast()``.
+        """
+        return any(
+            module._forward_hooks or module._forward_pre_hooks
+            for module in (self, self.adapter_down, self.adapter_down[0], self.non_linearity, self.adapter_up)
+        )
+
+    def forward_fast(self, x, residual_input):
+        """
+        Same as ``forward()``, but calls the functional versions of the adapter layers directly instead of calling
+        the modules, which avoids the overhead of module calls at inference. Requires ``supports_fused_bottleneck()``.
+        Hooks of the adapter modules are not called (see ``has_forward_hooks()``).
+        """
+        down_linear = self.adapter_down[0]
+        down = self.non_linearity.f(nn.functional.linear(x, down_linear.weight, down_linear.bias))
+        up = nn.functional.linear(down, self.adapter_up.weight, self.adapter_up.bias)
+        up = up * self.scaling
+
+        return up + residual_input, down, up
+
+    def forward_fused_bottleneck(self, x, residual_input, output_gating=False, return_intermediate=True):
+        """
+        Same as ``forward()``, but computes the adapter bottleneck via ``FusedAdapterFunction``, which doesn't store
+        intermediate activations for the backward pass. Requires ``supports_fused_bottleneck()``. The output of the
+        down-projection is not returned.
+        """
+        down_linear = self.adapter_down[0]
+        output, up = FusedAdapterFunction.apply(
+            x,
+            residual_input,
+            down_linear.weight,
+            down_linear.bias,
+            self.adapter_up.weight,
+            self.adapter_up.bias,
+            self.non_linearity,
+            self.scaling,
+        )
+        if not return_intermediate:
+            return (output,)
+        return output, None, up
+
+    def fold_layer_norm(self, layer_norm):
+        """
+        Folds the affine transformation of the given Transformer LayerNorm into the down-projection of this adapter.
+        The folded weights are cached and used by ``forward_fused()``. Only valid as long as all weights are frozen.
+
+        Args:
+            layer_norm: Transformer LayerNorm applied before the adapter.
+
+        Returns:
+            bool: True if the weights could be folded for this adapter configuration, False otherwise.
+        """
+        down = self.adapter_down[0]
+        if (
+            not self.original_ln_before
+            or not self.residual_before_ln
+            or self.add_layer_norm_before
+            or self.add_layer_norm_after
+            or self.use_gating
+            or not isinstance(down, nn.Linear)
+            or not isinstance(layer_norm, nn.LayerNorm)
+            or not layer_norm.elementwise_affine
+        ):
+            self._fused_down = None
+            return False
+
+        # down(gamma * x + beta) = (W_down * gamma) x + (W_down beta + b_down)
+        with torch.no_grad():
+            weight = down.weight * layer_norm.weight
+            bias = torch.mv(down.weight, layer_norm.bias) + down.bias
+        self._fused_down = (weight, bias)
+        return True
+
+    def forward_fused(self, hidden_states, input_tensor, layer_norm):
+        """
+        Combines ``pre_forward()`` and ``forward()`` using the weights folded by ``fold_layer_norm()``. Only the
+        normalization of the Transformer LayerNorm is computed here, its affine transformation is part of the folded
+        down-projection.
+
+        Returns: output, down, up
+        """
+        weight, bias = self._fused_down
+        normed = nn.functional.layer_norm(
+            hidden_states + input_tensor, layer_norm.normalized_shape, eps=layer_norm.eps
+        )
+        down = torch.addmm(bias, normed.view(-1, normed.size(-1)), weight.t())
+        down = self.non_linearity(down.view(normed.size()[:-1] + (-1,)))
+
+        up = self.adapter_up(down)
+        up = up * self.scaling
+        # folding requires residual_before_ln, i.e. the residual is the input of the Transformer LayerNorm
+        output = up + hidden_states
+
+        return output, down, up
+
     def post_forward(self, hidden_states, input_hidden_states, input_tensor, layer_norm):
         """
         Performs computations after the forward pass of the adapter block(s). This e.g. includes applying the residual
@@ -208,6 +467,8 @@ class Adapter(nn.Module):
         Returns:
             The modified hidden states.
         """
+        # This is not redundant to the Transformer LayerNorm potentially applied in pre_forward() (original_ln_before):
+        # there, the input of the adapter is normalized, here, its output.
         if self.original_ln_after:
             if layer_norm:
                 hidden_states = layer_norm(hidden_states + input_tensor)
@@ -230,6 +491,77 @@ class Adapter(nn.Module):
             module.bias.data.zero_()
 
 
+def can_group_adapters(adapters) -> bool:
+    """
+    Checks whether the bottlenecks of the given adapters can be computed jointly via ``grouped_adapter_bottleneck()``,
+    i.e. all adapters are plain sequential adapters of the same shape, non-linearity and scaling.
+    """
+    if len(adapters) < 2:
+        return False
+    first = adapters[0]
+    return all(
+        adapter.supports_fused_bottleneck()
+        and adapter.input_size == first.input_size
+        and adapter.down_sample == first.down_sample
+        and adapter.non_linearity.hidden_act == first.non_linearity.hidden_act
+        and adapter.scaling == first.scaling
+        for adapter in adapters
+    )
+
+
+def stack_adapter_weights(adapters):
+    """
+    Concatenates the down-projections and stacks the up-projections of the given adapters as used by
+    ``grouped_adapter_bottleneck()``.
+
+    Returns: down_weight, down_bias, up_weight, up_bias
+    """
+    # all down-projections are computed as one linear layer of size num_adapters * down_sample
+    down_weight = torch.cat([adapter.adapter_down[0].weight for adapter in adapters])
+    down_bias = torch.cat([adapter.adapter_down[0].bias for adapter in adapters])
+    up_weight = torch.stack([adapter.adapter_up.weight for adapter in adapters])
+    up_bias = torch.stack([adapter.adapter_up.bias for adapter in adapters])
+    return down_weight, down_bias, up_weight, up_bias
+
+
+def grouped_adapter_bottleneck(adapters, hidden_states, output_down: bool = False, weights=None):
+    """
+    Computes the scaled up-projection outputs of multiple adapters for the same input with one matrix multiplication
+    per projection. See ``can_group_adapters()`` for the supported adapters. Hooks of the adapter modules are not
+    called.
+
+    Args:
+        weights (tuple, optional): The weights of the adapters as returned by ``stack_adapter_weights()``. Stacked
+            from the given adapters if not given.
+
+    Returns:
+        torch.Tensor: The up-projection outputs of shape (batch_size, seq_len, num_adapters, hidden_size). If
+        output_down is set, a tuple of the bottleneck activations of shape (batch_size, seq_len, num_adapters,
+        down_sample) and the up-projection outputs.
+    """
+    first = adapters[0]
+    if weights is None:
+        weights = stack_adapter_weights(adapters)
+    down_weight, down_bias, up_weight, up_bias = weights
+    down = nn.functional.linear(hidden_states, down_weight, down_bias)
+    down = first.non_linearity(down.view(hidden_states.size()[:-1] + (len(adapters), first.down_sample)))
+
+    up = torch.einsum("...nk,ndk->...nd", down, up_weight) + up_bias
+    up = up * first.scaling
+
+    if output_down:
+        return down, up
+    return up
+
+
+def _parallel_pre_forward(hidden_states, input_tensor, layer_norm):
+    return input_tensor, None, input_tensor
+
+
+def _parallel_pre_forward_query(hidden_states, input_tensor, layer_norm):
+    return input_tensor, input_tensor, input_tensor
+
+
 class ParallelAdapter(Adapter):
     """
     Implementation of a parallel bottleneck adapter block.
@@ -238,32 +570,29 @@ class ParallelAdapter(Adapter):
     def __init__(self, adapter_name, input_size, down_sample, config: AdapterConfig):
         super().__init__(adapter_name, input_size, down_sample, config)
 
-    def pre_forward(
-        self,
-        hidden_states,
-        input_tensor,
-        layer_norm,
-        fusion_config=None,
-    ):
-        """
-        Retrieves the hidden_states, query (for Fusion), and residual connection according to the set configuration.
+    def get_pre_forward_fn(self, fusion_config=None):
+        # In case of parallel adapter, return the input tensor as hidden states
+        if fusion_config is not None:
+            return _parallel_pre_forward_query
+        else:
+            return _parallel_pre_forward
 
-        Args:
-            adapter_config: config file according to what the parameters are passed
-            hidden_states: output of previous layer
-            input_tensor: residual connection before FFN
+    def supports_output_buffer(self):
+        # the residual connection of parallel adapters is applied in post_forward()
+        return False
 
-        Returns: hidden_states, query, residual
+    def supports_fused_bottleneck(self):
+        # the residual connection of parallel adapters is applied in post_forward()
+        return False
 
-        """
-        # In case of parallel adapter, return the input tensor as hidden states
-        query = None
-        if fusion_config is not None:
-            query = input_tensor
-        return input_tensor, query, input_tensor
+    def fold_layer_norm(self, layer_norm):
+        # parallel adapters are not applied to the output of the Transformer LayerNorm
+        self._fused_down = None
+        return False
 
-    def forward(self, x, residual_input, output_gating=False):
-        down = self.adapter_down(x)
+    def forward(self, x, residual_input, output_gating=False, return_intermediate=True, down=None):
+        if down is None:
+            down = self.adapter_down(x)
 
         up = self.adapter_up(down)
         up = up * self.scaling
@@ -280,6 +609,8 @@ class ParallelAdapter(Adapter):
         if self.add_layer_norm_after:
             output = self.adapter_norm_after(output)
 
+        if not return_intermediate:
+            return (output, gate) if self.use_gating and output_gating else (output,)
         if self.use_gating and output_gating:
             return output, down, up, gate
         return output, down, up
@@ -356,21 +687,79 @@ class BertFusion(nn.Module):
             self.T = 1.0
         self.reduction = self.T / 1000.0
 
+        # key projection folded into the up-projections of the fused adapters, only used for inference
+        self._key_fold = None
+
+    def supports_key_folding(self, adapters) -> bool:
+        """
+        Whether the key projection of this layer can be folded into the up-projections of the given adapters via
+        ``fold_key_projection()``, i.e. all adapters have linear up-projections of the same shape.
+        """
+        return (
+            self.config["key"]
+            and len(adapters) > 0
+            and all(
+                isinstance(adapter.adapter_up, nn.Linear) and adapter.down_sample == adapters[0].down_sample
+                for adapter in adapters
+            )
+        )
+
+    def fold_key_projection(self, adapters):
+        """
+        Folds the key projection of this layer into the up-projections of the given adapters. The folded weights are
+        cached and used by ``forward_folded()``. Only valid as long as all weights are frozen.
+
+        Args:
+            adapters: The fused adapters in the order of their outputs. Requires ``supports_key_folding()``.
+        """
+        # key(scaling * (W_up d + b_up)) = (scaling * W_k W_up) d + (scaling * W_k b_up + b_k)
+        with torch.no_grad():
+            weight = torch.stack(
+                [torch.matmul(self.key.weight, adapter.adapter_up.weight) * adapter.scaling for adapter in adapters]
+            )
+            bias = torch.stack(
+                [torch.mv(self.key.weight, adapter.adapter_up.bias) * adapter.scaling for adapter in adapters]
+            )
+            bias = bias + self.key.bias
+        self._key_fold = (adapters, weight, bias)
+
     def forward(self, query, key, value, residual, output_attentions: bool = False):
 
         if self.config["residual_before"]:
             value += residual[:, :, None, :].repeat(1, 1, value.size(2), 1)
 
-        if self.config["query"]:
-            query_layer = self.query(query)
-        else:
-            query_layer = query
-
         if self.config["key"]:
             key_layer = self.key(key)
         else:
             key_layer = key
 
+        return self._attend(query, key_layer, value, residual, output_attentions)
+
+    def forward_folded(self, query, down, value, residual, output_attentions: bool = False):
+        """
+        Computes the fusion with the key projection folded by ``fold_key_projection()``. The keys are computed from
+        the bottleneck activations of the fused adapters instead of their up-projection outputs.
+
+        Args:
+            down: The bottleneck activations of shape (batch_size, seq_len, num_adapters, down_sample).
+            value: The up-projection outputs of shape (batch_size, seq_len, num_adapters, hidden_size).
+        """
+        _, weight, bias = self._key_fold
+        key_layer = torch.einsum("...nk,ndk->...nd", down, weight) + bias
+
+        if self.config["residual_before"]:
+            # the projected residual is the same for all adapters
+            key_layer = key_layer + nn.functional.linear(residual, self.key.weight)[:, :, None, :]
+            value += residual[:, :, None, :].repeat(1, 1, value.size(2), 1)
+
+        return self._attend(query, key_layer, value, residual, output_attentions)
+
+    def _attend(self, query, key_layer, value, residual, output_attentions):
+        if self.config["query"]:
+            query_layer = self.query(query)
+        else:
+            query_layer = query
+
         if self.config["value"] and self.config["value_before_softmax"]:
             # key/value have dims => batch, toks, number-of-adapters, feats
             value_layer = self.value(value)
@@ -1,9 +1,16 @@
 import warnings
+from collections import OrderedDict
+from types import MappingProxyType
+
+import torch
+from torch import nn
 
 from ....models.electra.modeling_electra import (ELECTRA_INPUTS_DOCSTRING, ELECTRA_START_DOCSTRING, ElectraModel, ElectraPreTrainedModel,
 )
-from ....utils import add_start_docstrings, add_start_docstrings_to_model_forward
+from ....utils import ModelOutput, add_start_docstrings, add_start_docstrings_to_model_forward
+from ...configuration import AdapterConfigBase, ConfigUnion
 from ...context import AdapterSetup
+from ...layer import AdapterLayer
 from ...heads import (
     BertStyleMaskedLMHead,
     BiaffineParsingHead,
@@ -17,6 +24,30 @@ from ...heads import (
 )
 
 
+# sequence lengths to which inputs are padded for CUDA graphs if not configured via config.cuda_graph_buckets
+DEFAULT_CUDA_GRAPH_BUCKETS = (32, 64, 128, 256, 512)
+# maximum number of CUDA graphs kept if not configured via config.cuda_graph_cache_size
+DEFAULT_CUDA_GRAPH_CACHE_SIZE = 16
+# heads with outputs per token, which are sliced back to the original sequence length after padding
+TOKEN_LEVEL_HEAD_TYPES = ("tagging", "question_answering", "masked_lm", "causal_lm")
+SEQUENCE_LEVEL_HEAD_TYPES = ("classification", "multilabel_classification", "multiple_choice")
+
+
+def _clone_outputs(outputs, seq_len=None):
+    if torch.is_tensor(outputs):
+        if seq_len is not None and outputs.dim() > 1:
+            outputs = outputs[:, :seq_len]
+        return outputs.clone()
+    elif isinstance(outputs, ModelOutput):
+        return outputs.__class__(**{k: _clone_outputs(v, seq_len) for k, v in outputs.items()})
+    elif isinstance(outputs, (tuple, list)):
+        return outputs.__class__(_clone_outputs(v, seq_len) for v in outputs)
+    elif isinstance(outputs, dict):
+        return {k: _clone_outputs(v, seq_len) for k, v in outputs.items()}
+    else:
+        return outputs
+
+
 @add_start_docstrings(
     """Electra Model transformer with the option to add multiple flexible heads on top.""",
     ELECTRA_START_DOCSTRING,
@@ -25,12 +56,29 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
     def __init__(self, config):
         super().__init__(config)
 
+        # CUDA graphs captured for inference if config.use_cuda_graph is set, least recently used first (see
+        # _forward_cuda_graph())
+        self._graph_cache = OrderedDict()
+        # state version of the adapter layers when the cached CUDA graphs were captured
+        self._graph_cache_version = None
+        # concatenated first layers of classification heads used by forward_heads_batched()
+        self._fused_head_cache = {}
+
         self.electra = ElectraModel(config)
 
         self._init_head_modules()
 
         self.init_weights()
 
+        # default for return_dict, read once instead of on every forward pass
+        self._use_return_dict = bool(config.use_return_dict)
+        # static input tensors of the CUDA graphs, shared by all graphs with the same input shape
+        self._static_inputs = {}
+        # memory pool shared by all CUDA graphs, allocated on first capture
+        self._graph_pool = None
+        # forward pass & heads compiled via torch.compile if config.compile_model is set (see _get_compiled_forward())
+        self._compiled_forward = None
+
     @add_start_docstrings_to_model_forward(ELECTRA_INPUTS_DOCSTRING.format("batch_size, sequence_length"))
     def forward(
         self,
@@ -46,20 +94,132 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
         head=None,
         output_adapter_gating_scores=False,
         output_adapter_fusion_attentions=False,
+        labels=None,
+        start_positions=None,
+        end_positions=None,
+        word_starts=None,
+        labels_arcs=None,
+        labels_rels=None,
         **kwargs
     ):
-        input_ids = input_ids.view(-1, input_ids.size(-1)) if input_ids is not None else None
-        attention_mask = attention_mask.view(-1, attention_mask.size(-1)) if attention_mask is not None else None
-        token_type_ids = token_type_ids.view(-1, token_type_ids.size(-1)) if token_type_ids is not None else None
-        position_ids = position_ids.view(-1, position_ids.size(-1)) if position_ids is not None else None
-        inputs_embeds = (
-            inputs_embeds.view(-1, inputs_embeds.size(-2), inputs_embeds.size(-1))
-            if inputs_embeds is not None
-            else None
+        # the arguments of the built-in heads are listed explicitly, additional keyword arguments are passed on to
+        # custom heads
+        return self._forward(
+            input_ids,
+            attention_mask,
+            token_type_ids,
+            position_ids,
+            head_mask,
+            inputs_embeds,
+            output_attentions,
+            output_hidden_states,
+            return_dict,
+            head,
+            output_adapter_gating_scores,
+            output_adapter_fusion_attentions,
+            labels=labels,
+            start_positions=start_positions,
+            end_positions=end_positions,
+            word_starts=word_starts,
+            labels_arcs=labels_arcs,
+            labels_rels=labels_rels,
+            **kwargs,
         )
 
-        return_dict = return_dict if return_dict is not None else self.config.use_return_dict
+    def _forward(
+        self,
+        input_ids=None,
+        attention_mask=None,
+        token_type_ids=None,
+        position_ids=None,
+        head_mask=None,
+        inputs_embeds=None,
+        output_attentions=None,
+        output_hidden_states=None,
+        return_dict=None,
+        head=None,
+        output_adapter_gating_scores=False,
+        output_adapter_fusion_attentions=False,
+        **kwargs
+    ):
+        # flatten inputs with additional dimensions (e.g. for multiple choice), usually they are already 2-D
+        if input_ids is not None and input_ids.dim() != 2:
+            input_ids = input_ids.view(-1, input_ids.size(-1))
+        if attention_mask is not None and attention_mask.dim() != 2:
+            attention_mask = attention_mask.view(-1, attention_mask.size(-1))
+        if token_type_ids is not None and token_type_ids.dim() != 2:
+            token_type_ids = token_type_ids.view(-1, token_type_ids.size(-1))
+        if position_ids is not None and position_ids.dim() != 2:
+            position_ids = position_ids.view(-1, position_ids.size(-1))
+        if inputs_embeds is not None and inputs_embeds.dim() != 3:
+            inputs_embeds = inputs_embeds.view(-1, inputs_embeds.size(-2), inputs_embeds.size(-1))
+
+        return_dict = self._use_return_dict if return_dict is None else return_dict
+
+        if (
+            getattr(self.config, "use_cuda_graph", False)
+            and input_ids is not None
+            and input_ids.is_cuda
+            and inputs_embeds is None
+            and head_mask is None
+            and not (output_attentions if output_attentions is not None else self.config.output_attentions)
+            and not (output_hidden_states if output_hidden_states is not None else self.config.output_hidden_states)
+            and not output_adapter_gating_scores
+            and not output_adapter_fusion_attentions
+            and all(v is None for v in kwargs.values())
+            and not self.training
+            and not torch.is_grad_enabled()
+            and AdapterSetup.get_context() is None
+        ):
+            return self._forward_cuda_graph(input_ids, attention_mask, token_type_ids, position_ids, head, return_dict)
 
+        forward_model, forward_head = self._forward_model, None
+        compiled_forward = self._get_compiled_forward() if getattr(self.config, "compile_model", False) else None
+        if compiled_forward is not None:
+            # collecting gating scores & fusion attentions breaks the graph, so only use the compiled head in this case
+            if output_adapter_gating_scores or output_adapter_fusion_attentions:
+                forward_head = compiled_forward[1]
+            else:
+                forward_model = compiled_forward[0]
+
+        outputs = forward_model(
+            input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+            position_ids=position_ids,
+            head_mask=head_mask,
+            inputs_embeds=inputs_embeds,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            return_dict=return_dict,
+            head=head,
+            output_adapter_gating_scores=output_adapter_gating_scores,
+            output_adapter_fusion_attentions=output_adapter_fusion_attentions,
+            forward_head=forward_head,
+            **kwargs,
+        )
+        if compiled_forward is not None:
+            # outputs of CUDA graphs captured by torch.compile are overwritten by the next call
+            outputs = _clone_outputs(outputs)
+        return outputs
+
+    def _forward_model(
+        self,
+        input_ids,
+        attention_mask=None,
+        token_type_ids=None,
+        position_ids=None,
+        head_mask=None,
+        inputs_embeds=None,
+        output_attentions=None,
+        output_hidden_states=None,
+        return_dict=None,
+        head=None,
+        output_adapter_gating_scores=False,
+        output_adapter_fusion_attentions=False,
+        forward_head=None,
+        **kwargs
+    ):
         electra_outputs = self.electra(
             input_ids,
             attention_mask=attention_mask,
@@ -75,7 +235,9 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             output_adapter_fusion_attentions=output_adapter_fusion_attentions,
         )
 
-        outputs = self.forward_head(
+        # heads receive the attention mask as given, as custom heads might rely on its data type
+        forward_head = forward_head or self.forward_head
+        outputs = forward_head(
             electra_outputs,
             head_name=head,
             attention_mask=attention_mask,
@@ -85,16 +247,310 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
 
         return outputs
 
-    head_types = {
-        "classification": ClassificationHead,
-        "multilabel_classification": MultiLabelClassificationHead,
-        "tagging": TaggingHead,
-        "multiple_choice": MultipleChoiceHead,
-        "question_answering": QuestionAnsweringHead,
-        "dependency_parsing": BiaffineParsingHead,
-        "masked_lm": BertStyleMaskedLMHead,
-        "causal_lm": CausalLMHead,
-    }
+    def _get_compiled_forward(self):
+        """
+        Lazily compiles the forward pass and the prediction heads via ``torch.compile`` in "reduce-overhead" mode. As
+        this mode requires static shapes, each new input shape triggers a recompilation. Returns None if the installed
+        PyTorch version does not support ``torch.compile``.
+
+        The compiled functions are bound to this model. Copies (e.g. via ``copy.deepcopy()``) compile their own, while
+        replicas of ``nn.DataParallel``, which share the attributes of this model, run in eager mode.
+        """
+        if self._compiled_forward is None:
+            if not hasattr(torch, "compile"):
+                warnings.warn("config.compile_model requires torch.compile (PyTorch>=2.0). Running in eager mode.")
+                self._compiled_forward = False
+            else:
+                self._compiled_forward = (
+                    self,
+                    torch.compile(self._forward_model, mode="reduce-overhead", dynamic=False),
+                    torch.compile(self.forward_head, mode="reduce-overhead", dynamic=False),
+                )
+        if not self._compiled_forward or self._compiled_forward[0] is not self:
+            return None
+        return self._compiled_forward[1:]
+
+    def _prepare_static_buffers(self, batch_size, seq_len, device, dtype):
+        """
+        Returns the static input tensors for CUDA graphs of the given input shape, allocating them on first use. Token
+        ids are stored as ``torch.long``, the attention mask in the given data type.
+        """
+        key = (batch_size, seq_len, device, dtype)
+        buffers = self._static_inputs.get(key, None)
+        if buffers is None:
+            buffers = {
+                "input_ids": torch.empty((batch_size, seq_len), dtype=torch.long, device=device),
+                "attention_mask": torch.empty((batch_size, seq_len), dtype=dtype, device=device),
+                "token_type_ids": torch.empty((batch_size, seq_len), dtype=torch.long, device=device),
+                "position_ids": torch.empty((batch_size, seq_len), dtype=torch.long, device=device),
+            }
+            self._static_inputs[key] = buffers
+        return buffers
+
+    def _get_graph_bucket(self, seq_len, head):
+        """
+        Returns the sequence length of the CUDA graph used for inputs of the given length and whether the outputs have
+        to be sliced back to the input length. Inputs are padded to the smallest fitting bucket in
+        ``config.cuda_graph_buckets`` if all outputs of the used head are either per token or per sequence. Inputs are
+        never padded if any active adapter uses gating, as gates are averaged over all tokens including padding.
+        Returns None for inputs exceeding the largest bucket.
+        """
+        if self._active_adapters_use_gating():
+            return seq_len, False
+        buckets = getattr(self.config, "cuda_graph_buckets", DEFAULT_CUDA_GRAPH_BUCKETS)
+        bucket = next((b for b in sorted(buckets) if b >= seq_len), None)
+        if bucket is None:
+            return None, False
+        bucket = min(bucket, self.config.max_position_embeddings)
+
+        used_heads = [head] if head is not None else self._active_heads
+        if not isinstance(used_heads, list) or len(used_heads) > 1:
+            return seq_len, False
+        elif len(used_heads) == 0:
+            # the outputs of the base model are per token
+            return bucket, True
+        head_type = self.heads[used_heads[0]].config.get("head_type", None)
+        if head_type in TOKEN_LEVEL_HEAD_TYPES:
+            return bucket, True
+        elif head_type in SEQUENCE_LEVEL_HEAD_TYPES:
+            return bucket, False
+        else:
+            return seq_len, False
+
+    def _active_adapters_use_gating(self):
+        """
+        Whether any module (bottleneck adapter, LoRA or prefix tuning) of the active adapters uses gating. The result
+        is cached until the active adapters or the adapters of the model change.
+        """
+        active_adapters = self.active_adapters
+        version = self._get_adapter_state_version()
+        cached = self.__dict__.get("_use_gating_cache", None)
+        if cached is None or cached[0] is not active_adapters or cached[1] != version:
+            use_gating = False
+            for adapter_name in active_adapters.flatten() if active_adapters is not None else []:
+                config = self.config.adapters.get(adapter_name)
+                if config is None:
+                    continue
+                config = AdapterConfigBase.load(config)
+                configs = config.configs if isinstance(config, ConfigUnion) else [config]
+                use_gating = use_gating or any(c.get("use_gating", False) for c in configs)
+            cached = (active_adapters, version, use_gating)
+            self._use_gating_cache = cached
+        return cached[2]
+
+    def _forward_cuda_graph(self, input_ids, attention_mask, token_type_ids, position_ids, head, return_dict):
+        """
+        Runs the forward pass for inference by replaying a CUDA graph. Inputs are padded to a bucketed sequence length
+        (see ``_get_graph_bucket()``), so that a small pool of graphs covers variable sequence lengths. A graph is
+        captured on the first call for each combination of padded input shape, head and data type and recaptured if
+        the active adapters or heads change or if any parameter was moved to new memory (e.g. by ``model.cpu()`` and
+        ``model.cuda()`` or by merging LoRA weights). All graphs are released if adapters are added, deleted or
+        transformed (e.g. via ``eval_fused()``) or if heads are added or deleted. At most
+        ``config.cuda_graph_cache_size`` graphs are kept, the least recently used graph is released first. The given
+        inputs are copied into the static input tensors (see ``_prepare_static_buffers()``) before replaying.
+
+        All graphs share one memory pool. This is safe as graphs are never replayed concurrently and their outputs are
+        cloned right after replaying.
+        """
+        batch_size, seq_len = input_ids.shape
+        bucket, slice_outputs = self._get_graph_bucket(seq_len, head)
+        if bucket is None:
+            return self._forward_model(
+                input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+                position_ids=position_ids,
+                head=head,
+                return_dict=return_dict,
+            )
+
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+            "position_ids": position_ids,
+        }
+        mask_dtype = attention_mask.dtype if attention_mask is not None else torch.long
+        buffers = self._prepare_static_buffers(batch_size, bucket, input_ids.device, mask_dtype)
+        static_inputs = {}
+        for k, v in inputs.items():
+            if v is not None:
+                static_inputs[k] = buffers[k]
+                static_inputs[k][:, :seq_len].copy_(v)
+            else:
+                static_inputs[k] = None
+        if bucket > seq_len:
+            # padded positions are excluded via the attention mask
+            pad_token_id = self.config.pad_token_id if self.config.pad_token_id is not None else 0
+            static_inputs["input_ids"][:, seq_len:].fill_(pad_token_id)
+            if attention_mask is None:
+                static_inputs["attention_mask"] = buffers["attention_mask"]
+                static_inputs["attention_mask"][:, :seq_len].fill_(1)
+            static_inputs["attention_mask"][:, seq_len:].fill_(0)
+            for k in ("token_type_ids", "position_ids"):
+                if static_inputs[k] is not None:
+                    static_inputs[k][:, seq_len:].fill_(0)
+
+        version = self._get_adapter_state_version()
+        if version != self._graph_cache_version:
+            # adapters were added, deleted, (de-)activated or transformed since capturing
+            self._release_cuda_graphs()
+            self._graph_cache_version = version
+        key = ((batch_size, bucket), input_ids.device, mask_dtype, self.dtype, head, return_dict) + tuple(
+            v is not None for v in static_inputs.values()
+        )
+        # the graph reads parameters & buffers from the memory they had while capturing, which is freed if they are
+        # replaced (e.g. by moving the model or by assigning to param.data)
+        data_ptrs = tuple(t.data_ptr() for t in self.parameters()) + tuple(t.data_ptr() for t in self.buffers())
+        entry = self._graph_cache.get(key, None)
+        if (
+            entry is None
+            or entry[0] is not self.active_adapters
+            or entry[1] is not self._active_heads
+            or entry[4] != data_ptrs
+        ):
+            if entry is not None:
+                # release the outdated graph before capturing its replacement
+                del self._graph_cache[key]
+                entry = None
+            # warm up on a side stream before capturing, as recommended for CUDA graphs
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    self._forward_model(**static_inputs, head=head, return_dict=return_dict)
+            torch.cuda.current_stream().wait_stream(stream)
+            if self._graph_pool is None:
+                self._graph_pool = torch.cuda.graph_pool_handle()
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph, pool=self._graph_pool):
+                static_outputs = self._forward_model(**static_inputs, head=head, return_dict=return_dict)
+            # the graph doesn't own the static inputs it reads, so keep them alive as long as the graph
+            entry = (self.active_adapters, self._active_heads, graph, static_outputs, data_ptrs, buffers)
+            self._graph_cache[key] = entry
+            cache_size = getattr(self.config, "cuda_graph_cache_size", DEFAULT_CUDA_GRAPH_CACHE_SIZE)
+            if len(self._graph_cache) > cache_size:
+                self._graph_cache.popitem(last=False)
+                # release the static inputs which are not used by any of the remaining graphs
+                used_buffers = [e[5] for e in self._graph_cache.values()]
+                for static_key, static_buffers in list(self._static_inputs.items()):
+                    if not any(static_buffers is b for b in used_buffers):
+                        del self._static_inputs[static_key]
+        else:
+            self._graph_cache.move_to_end(key)
+        entry[2].replay()
+        # the static outputs are overwritten by the next replay
+        return _clone_outputs(entry[3], seq_len if slice_outputs and bucket > seq_len else None)
+
+    def _get_adapter_state_version(self):
+        """
+        Returns the latest state version of all adapter layers of the model, which changes whenever adapters are added,
+        deleted or (de-)activated (see ``AdapterLayer._recompile_active()``).
+        """
+        adapter_layers = self.__dict__.get("_adapter_layers", None)
+        if adapter_layers is None:
+            adapter_layers = tuple(
+                module
+                for _, layer in self.electra.iter_layers()
+                for module in layer.modules()
+                if isinstance(module, AdapterLayer)
+            )
+            self._adapter_layers = adapter_layers
+        return max((layer._state_version for layer in adapter_layers), default=None)
+
+    def __getstate__(self):
+        # CUDA graphs can't be copied or pickled, copies recapture them on demand
+        state = self.__dict__.copy()
+        state["_graph_cache"] = OrderedDict()
+        state["_static_inputs"] = {}
+        state["_graph_pool"] = None
+        # compiled functions are bound to this model and can't be pickled, copies compile their own
+        if state["_compiled_forward"]:
+            state["_compiled_forward"] = None
+        return state
+
+    def _release_cuda_graphs(self):
+        """
+        Releases all captured CUDA graphs and their static input tensors.
+        """
+        self._graph_cache.clear()
+        self._static_inputs.clear()
+
+    def add_prediction_head(self, head, overwrite_ok=False, set_active=True):
+        super().add_prediction_head(head, overwrite_ok=overwrite_ok, set_active=set_active)
+        # captured CUDA graphs & fused head weights might use a replaced head
+        self._release_cuda_graphs()
+        self._fused_head_cache.clear()
+
+    def delete_head(self, head_name):
+        super().delete_head(head_name)
+        self._release_cuda_graphs()
+        self._fused_head_cache.clear()
+
+    def forward_heads_batched(self, head_names, electra_outputs):
+        """
+        Forwards the outputs of the base model through multiple classification heads at once. Without gradients and in
+        evaluation mode, the first linear layers of all heads are computed in a single matrix multiplication. Their
+        concatenated weights are cached per combination of heads and rebuilt if a head or its weights are changed.
+
+        Args:
+            head_names (List[str]): The names of the classification heads.
+            electra_outputs: The outputs of the base model as returned by ``self.electra()``.
+
+        Returns:
+            Tuple[torch.Tensor]: The logits of each head.
+        """
+        heads = []
+        for head_name in head_names:
+            if head_name not in self.heads:
+                raise ValueError("Unknown head_name '{}'".format(head_name))
+            head = self.heads[head_name]
+            if not isinstance(head, (ClassificationHead, MultiLabelClassificationHead)) or head.config["use_pooler"]:
+                raise ValueError(f"Head '{head_name}' is not a classification head on the first token.")
+            heads.append(head)
+        cls_output = electra_outputs[0][:, 0]
+        if self.training or torch.is_grad_enabled():
+            # weights are updated during training, so the cached weights would be outdated anyway
+            self._fused_head_cache.clear()
+            return tuple(head(electra_outputs, cls_output)[0] for head in heads)
+
+        layers = [[module for module in head if not isinstance(module, nn.Dropout)] for head in heads]
+        versions = tuple((p.data_ptr(), p._version) for modules in layers for p in modules[0].parameters())
+        key = tuple(head_names)
+        entry = self._fused_head_cache.get(key, None)
+        if entry is None or entry[1] != versions or any(a is not b for a, b in zip(entry[0], heads)):
+            # a single entry per combination of heads, replaced once the heads or their weights change
+            weight = torch.cat([modules[0].weight for modules in layers])
+            bias = torch.cat(
+                [
+                    modules[0].bias if modules[0].bias is not None else weight.new_zeros(modules[0].out_features)
+                    for modules in layers
+                ]
+            )
+            entry = (heads, versions, weight, bias, [modules[0].out_features for modules in layers])
+            self._fused_head_cache[key] = entry
+        _, _, weight, bias, split_sizes = entry
+
+        fused_output = torch.addmm(bias, cls_output, weight.t())
+        logits = []
+        for hidden_states, modules in zip(torch.split(fused_output, split_sizes, dim=-1), layers):
+            for module in modules[1:]:
+                hidden_states = module(hidden_states)
+            logits.append(hidden_states)
+        return tuple(logits)
+
+    head_types = MappingProxyType(
+        {
+            "classification": ClassificationHead,
+            "multilabel_classification": MultiLabelClassificationHead,
+            "tagging": TaggingHead,
+            "multiple_choice": MultipleChoiceHead,
+            "question_answering": QuestionAnsweringHead,
+            "dependency_parsing": BiaffineParsingHead,
+            "masked_lm": BertStyleMaskedLMHead,
+            "causal_lm": CausalLMHead,
+        }
+    )
 
     def add_classification_head(
         self,
@@ -117,13 +573,16 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             classification setup. Defaults to False.
         """
 
-        if multilabel:
-            head = MultiLabelClassificationHead(
-                self, head_name, num_labels, layers, activation_function, id2label, use_pooler
-            )
-        else:
-            head = ClassificationHead(self, head_name, num_labels, layers, activation_function, id2label, use_pooler)
-        self.add_prediction_head(head, overwrite_ok)
+        self._add_head(
+            "multilabel_classification" if multilabel else "classification",
+            head_name,
+            overwrite_ok,
+            num_labels=num_labels,
+            layers=layers,
+            activation_function=activation_function,
+            id2label=id2label,
+            use_pooler=use_pooler,
+        )
 
     def add_multiple_choice_head(
         self,
@@ -143,8 +602,16 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             function. Defaults to 'tanh'. overwrite_ok (bool, optional): Force overwrite if a head with the same name
             exists. Defaults to False.
         """
-        head = MultipleChoiceHead(self, head_name, num_choices, layers, activation_function, id2label, use_pooler)
-        self.add_prediction_head(head, overwrite_ok)
+        self._add_head(
+            "multiple_choice",
+            head_name,
+            overwrite_ok,
+            num_choices=num_choices,
+            layers=layers,
+            activation_function=activation_function,
+            id2label=id2label,
+            use_pooler=use_pooler,
+        )
 
     def add_tagging_head(
         self, head_name, num_labels=2, layers=1, activation_function="tanh", overwrite_ok=False, id2label=None
@@ -157,14 +624,28 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             optional): Activation function. Defaults to 'tanh'. overwrite_ok (bool, optional): Force overwrite if a
             head with the same name exists. Defaults to False.
         """
-        head = TaggingHead(self, head_name, num_labels, layers, activation_function, id2label)
-        self.add_prediction_head(head, overwrite_ok)
+        self._add_head(
+            "tagging",
+            head_name,
+            overwrite_ok,
+            num_labels=num_labels,
+            layers=layers,
+            activation_function=activation_function,
+            id2label=id2label,
+        )
 
     def add_qa_head(
         self, head_name, num_labels=2, layers=1, activation_function="tanh", overwrite_ok=False, id2label=None
     ):
-        head = QuestionAnsweringHead(self, head_name, num_labels, layers, activation_function, id2label)
-        self.add_prediction_head(head, overwrite_ok)
+        self._add_head(
+            "question_answering",
+            head_name,
+            overwrite_ok,
+            num_labels=num_labels,
+            layers=layers,
+            activation_function=activation_function,
+            id2label=id2label,
+        )
 
     def add_dependency_parsing_head(self, head_name, num_labels=2, overwrite_ok=False, id2label=None):
         """
@@ -176,8 +657,7 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             overwrite_ok (bool, optional): Force overwrite if a head with the same name exists. Defaults to False.
             id2label (dict, optional): Mapping from label ids to labels. Defaults to None.
         """
-        head = BiaffineParsingHead(self, head_name, num_labels, id2label)
-        self.add_prediction_head(head, overwrite_ok)
+        self._add_head("dependency_parsing", head_name, overwrite_ok, num_labels=num_labels, id2label=id2label)
 
     def add_masked_lm_head(self, head_name, activation_function="gelu", overwrite_ok=False):
         """
@@ -187,8 +667,7 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             to 'gelu'. overwrite_ok (bool, optional): Force overwrite if a head with the same name exists. Defaults to
             False.
         """
-        head = BertStyleMaskedLMHead(self, head_name, activation_function=activation_function)
-        self.add_prediction_head(head, overwrite_ok=overwrite_ok)
+        self._add_head("masked_lm", head_name, overwrite_ok, activation_function=activation_function)
 
     def add_causal_lm_head(self, head_name, activation_function="gelu", overwrite_ok=False):
         """
@@ -198,10 +677,15 @@ class ElectraAdapterModel(ModelWithFlexibleHeadsAdaptersMixin, ElectraPreTrained
             to 'gelu'. overwrite_ok (bool, optional): Force overwrite if a head with the same name exists. Defaults to
             False.
         """
-        head = CausalLMHead(
-            self, head_name, layers=2, activation_function=activation_function, layer_norm=True, bias=True
+        self._add_head(
+            "causal_lm",
+            head_name,
+            overwrite_ok,
+            layers=2,
+            activation_function=activation_function,
+            layer_norm=True,
+            bias=True,
         )
-        self.add_prediction_head(head, overwrite_ok=overwrite_ok)
 
 
 class ElectraModelWithHeads(ElectraAdapterModel):
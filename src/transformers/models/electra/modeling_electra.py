@@ -490,6 +490,22 @@ class ElectraLayer(nn.Module):
         past_key_value: Optional[Tuple[Tuple[torch.FloatTensor]]] = None,
         output_attentions: Optional[bool] = False,
     ) -> Tuple[torch.Tensor]:
+        # replay CUDA graphs captured via ElectraModel.capture_piecewise_graphs() if possible
+        piecewise_graphs = self.__dict__.get("piecewise_graphs", None)
+        if piecewise_graphs is not None:
+            outputs = piecewise_graphs.forward(
+                self,
+                hidden_states,
+                attention_mask,
+                head_mask,
+                encoder_hidden_states,
+                encoder_attention_mask,
+                past_key_value,
+                output_attentions,
+            )
+            if outputs is not None:
+                return outputs
+
         # decoder uni-directional self-attention cached key/values tuple is at positions 1,2
         self_attn_past_key_value = past_key_value[:2] if past_key_value is not None else None
         self_attention_outputs = self.attention(
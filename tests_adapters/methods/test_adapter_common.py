@@ -16,8 +16,9 @@ from transformers import (
     PfeifferConfig,
     PfeifferInvConfig,
 )
-from transformers.adapters import BatchSplit, Fuse
-from transformers.testing_utils import require_torch, torch_device
+from transformers.adapters import BatchSplit, Fuse, Stack
+from transformers.adapters.modeling import Adapter
+from transformers.testing_utils import require_torch, require_torch_gpu, torch_device
 
 from .base import AdapterMethodBaseTestMixin, create_twin_models
 
@@ -139,6 +140,111 @@ class BottleneckAdapterTestMixin(AdapterMethodBaseTestMixin):
             with self.subTest(model_class=model.__class__.__name__, config=adapter_config.__class__.__name__):
                 self.run_forward_test(model, adapter_config)
 
+    def test_eval_fused_forward(self):
+        model = self.get_model()
+        model.eval()
+
+        model.add_adapter("fused", config=PfeifferConfig())
+        model.set_active_adapters("fused")
+        # make sure the folded layer norm affine transformation is not the identity
+        for module in model.modules():
+            if isinstance(module, torch.nn.LayerNorm) and module.elementwise_affine:
+                module.weight.data.normal_(mean=1.0, std=0.1)
+                module.bias.data.normal_(mean=0.0, std=0.1)
+        model.to(torch_device)
+
+        input_data = self.get_input_samples(config=model.config)
+        output_1 = model(**input_data)
+
+        model.eval_fused()
+        output_2 = model(**input_data)
+
+        self.assertEqual(len(output_1), len(output_2))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+
+        model.eval_fused(trace=True)
+        output_3 = model(**input_data)
+        output_4 = model(**input_data)
+
+        self.assertTrue(torch.allclose(output_1[0], output_3[0], atol=1e-5))
+        self.assertTrue(torch.equal(output_3[0], output_4[0]))
+
+    def test_fused_bottleneck_backward(self):
+        model = self.get_model()
+        model.add_adapter("fused", config=HoulsbyConfig())
+        model.train_adapter("fused")
+        # disable dropout to compare gradients
+        model.eval()
+        model.to(torch_device)
+        input_data = self.get_input_samples(config=model.config)
+
+        grads = []
+        for enabled in [False, True]:
+            model.fuse_adapter_bottlenecks(enabled)
+            model.zero_grad()
+            output = model(**input_data)
+            output[0].sum().backward()
+            grads.append({k: v.grad.clone() for k, v in self.filter_parameters(model, ["adapters.fused."]).items()})
+
+        self.assertEqual(grads[0].keys(), grads[1].keys())
+        for k in grads[0]:
+            self.assertTrue(torch.allclose(grads[0][k], grads[1][k], atol=1e-5), k)
+
+    def test_forward_fast(self):
+        model = self.get_model()
+        model.eval()
+
+        model.add_adapter("a", config=PfeifferConfig())
+        model.add_adapter("b", config=PfeifferConfig())
+        model.set_active_adapters(Stack("a", "b"))
+        model.to(torch_device)
+
+        input_data = self.get_input_samples(config=model.config)
+        output_1 = model(**input_data)
+
+        # registered hooks disable the inference path without module calls
+        handles = [
+            module.register_forward_hook(lambda *args: None)
+            for module in model.modules()
+            if isinstance(module, Adapter)
+        ]
+        output_2 = model(**input_data)
+        for handle in handles:
+            handle.remove()
+
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-6))
+
+    def test_quantize_adapters(self):
+        # dynamic quantization is only supported on CPU
+        model = self.get_model().to("cpu")
+        model.eval()
+
+        model.add_adapter("quantized", config=PfeifferConfig())
+        model.set_active_adapters("quantized")
+        input_data = {k: v.to("cpu") for k, v in self.get_input_samples(config=model.config).items()}
+        output_1 = model(**input_data)
+
+        model.quantize_adapters()
+        for module in model.modules():
+            if isinstance(module, Adapter):
+                self.assertIsInstance(module.adapter_down[0], torch.nn.quantized.dynamic.Linear)
+                self.assertIsInstance(module.adapter_up, torch.nn.quantized.dynamic.Linear)
+        output_2 = model(**input_data)
+
+        self.assertEqual(len(output_1), len(output_2))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-2))
+
+    @require_torch_gpu
+    def test_quantize_adapters_gpu(self):
+        model = self.get_model().to("cuda")
+        model.add_adapter("quantized", config=PfeifferConfig())
+
+        with self.assertRaises(ValueError):
+            model.quantize_adapters()
+        for module in model.modules():
+            if isinstance(module, Adapter):
+                self.assertIsInstance(module.adapter_down[0], torch.nn.Linear)
+
     def test_load_adapter(self):
         self.run_load_test(PfeifferConfig())
 
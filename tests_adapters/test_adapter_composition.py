@@ -1,5 +1,6 @@
 import copy
 import random
+import threading
 import unittest
 
 import torch
@@ -31,6 +32,7 @@ class AdapterCompositionParsingTest(unittest.TestCase):
 
     def test_to_deep(self):
         self.assertRaises(ValueError, lambda: parse_composition(Stack("a", Fuse("b", Stack(Fuse("c", "d"), "e")))))
+        self.assertRaises(ValueError, lambda: parse_composition(Parallel(Stack("a", Stack("b", "c")), "d")))
 
     def test_invalid_nesting_fusion(self):
         self.assertRaises(ValueError, lambda: parse_composition(Fuse(Fuse("a", "b"), "c")))
@@ -95,6 +97,44 @@ class AdapterCompositionTest(unittest.TestCase):
 
         self.training_pass()
 
+    def test_stack_without_grad(self):
+        self.model.eval()
+        inputs = {"input_ids": ids_tensor((2, 128), 1000).to(torch_device)}
+
+        for adapter_setup in [Stack("a", "b", "c", "d"), Stack("a", "b", Split("c", "d", split_index=64), "a", "b")]:
+            self.model.set_active_adapters(adapter_setup)
+            # intermediate outputs of the stack are written into reused buffers only without autograd
+            logits_1 = self.model(**inputs).logits
+            with torch.no_grad():
+                logits_2 = self.model(**inputs).logits
+                logits_3 = self.model(**inputs).logits
+            self.assertTrue(torch.allclose(logits_1, logits_2, atol=1e-6))
+            self.assertTrue(torch.equal(logits_2, logits_3))
+
+    def test_stack_without_grad_threads(self):
+        self.model.eval()
+        self.model.set_active_adapters(Stack("a", "b", "c", "d"))
+        inputs = [{"input_ids": ids_tensor((2, 128), 1000).to(torch_device)} for _ in range(4)]
+        with torch.no_grad():
+            expected = [self.model(**input_data).logits for input_data in inputs]
+
+        # the buffers of stacks are held by the thread-local forward context, so concurrent passes don't interfere
+        def forward(i, results):
+            with torch.no_grad():
+                for _ in range(5):
+                    results[i].append(self.model(**inputs[i]).logits)
+
+        results = [[] for _ in inputs]
+        threads = [threading.Thread(target=forward, args=(i, results)) for i in range(len(inputs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for logits, thread_results in zip(expected, results):
+            self.assertEqual(5, len(thread_results))
+            for thread_logits in thread_results:
+                self.assertTrue(torch.allclose(logits, thread_logits, atol=1e-6))
+
     def test_nested_split(self):
         # split into two stacks
         self.model.set_active_adapters(Split(Split("a", "b", split_index=32), "c", split_index=64))
@@ -1,4 +1,5 @@
 import copy
+import inspect
 import os
 import tempfile
 from dataclasses import asdict
@@ -8,11 +9,15 @@ import torch
 from transformers import (
     ADAPTER_MODEL_MAPPING,
     ADAPTERFUSION_CONFIG_MAP,
+    AdapterActivationCache,
     AdapterConfig,
+    AdapterFusionConfig,
     AutoAdapterModel,
     PfeifferConfig,
 )
-from transformers.adapters.composition import Fuse
+from transformers.adapters.composition import BatchSplit, Fuse, Stack
+from transformers.adapters.layer import AdapterLayer
+from transformers.adapters.modeling import can_group_adapters, grouped_adapter_bottleneck
 from transformers.adapters.utils import ADAPTERFUSION_WEIGHTS_NAME
 from transformers.testing_utils import require_torch, torch_device
 
@@ -218,3 +223,190 @@ class AdapterFusionModelTestMixin:
             self.assertEqual(len(per_layer_scores), 1)
             for k, v in per_layer_scores.items():
                 self.assertEqual(self.default_input_samples_shape[0], v.shape[0], k)
+
+    def test_fusion_regularization_loss(self):
+        model = self.get_model()
+        model.eval()
+
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_adapter_fusion(["a", "b"], "dynamic")
+        model.to(torch_device)
+
+        expected_loss = 0.0
+        for _, layer in model.base_model.iter_layers():
+            for name, module in layer.named_modules():
+                if name.endswith("adapter_fusion_layer.a,b"):
+                    target = torch.eye(module.value.weight.shape[0], device=torch_device)
+                    expected_loss += 0.01 * (target - module.value.weight).pow(2).sum()
+        reg_loss = model.base_model.get_fusion_regularization_loss()
+        self.assertTrue(torch.allclose(expected_loss, reg_loss))
+
+        model.delete_adapter_fusion(["a", "b"])
+        self.assertEqual(0.0, model.base_model.get_fusion_regularization_loss())
+
+    def test_fold_fusion_for_eval(self):
+        # adapters with different non-linearities are not computed jointly
+        for adapter_config, residual_before in [
+            ("pfeiffer", False),
+            ("pfeiffer", True),
+            (PfeifferConfig(non_linearity="gelu"), False),
+            (PfeifferConfig(non_linearity="gelu"), True),
+        ]:
+            model = self.get_model()
+            model.eval()
+
+            model.add_adapter("a")
+            model.add_adapter("b", config=adapter_config)
+            fusion_config = AdapterFusionConfig.load("dynamic", residual_before=residual_before)
+            model.add_adapter_fusion(["a", "b"], fusion_config, set_active=True)
+            model.to(torch_device)
+
+            input_data = self.get_input_samples(config=model.config)
+            output_1 = model(**input_data)
+
+            model.fold_fusion_for_eval()
+            output_2 = model(**input_data)
+            self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+
+    def test_adapter_activation_cache(self):
+        model = self.get_model()
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_adapter_fusion(["a", "b"])
+        model.train_adapter_fusion(Fuse("a", "b"))
+        # disable dropout to compare outputs
+        model.eval()
+        model.to(torch_device)
+
+        input_data = self.get_input_samples(config=model.config)
+        output_1 = model(**input_data)
+
+        cache = AdapterActivationCache()
+        model.set_adapter_activation_cache(cache)
+        output_2 = model(**input_data)
+        num_cached = len(cache)
+        self.assertGreater(num_cached, 0)
+        output_3 = model(**input_data)
+        self.assertEqual(num_cached, len(cache))
+
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output_1[0], output_3[0], atol=1e-5))
+        output_3[0].sum().backward()
+
+        model.set_adapter_activation_cache(None)
+
+    def test_adapter_activation_cache_batch_split(self):
+        model = self.get_model()
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.freeze_model(True)
+        batch_size = self.default_input_samples_shape[0]
+        model.set_active_adapters(BatchSplit(Stack("a", "b"), Stack("b", "a"), batch_sizes=[1, batch_size - 1]))
+        model.eval()
+        model.to(torch_device)
+
+        input_data = self.get_input_samples(config=model.config)
+        output_1 = model(**input_data)
+
+        cache = AdapterActivationCache()
+        model.set_adapter_activation_cache(cache)
+        output_2 = model(**input_data)
+        output_3 = model(**input_data)
+        # the activations of sub-batches are not cached
+        self.assertEqual(0, len(cache))
+
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output_1[0], output_3[0], atol=1e-5))
+
+        model.set_adapter_activation_cache(None)
+
+    def test_adapter_activation_cache_token_type_ids(self):
+        model = self.get_model()
+        if (
+            "token_type_ids" not in inspect.signature(model.base_model.forward).parameters
+            or getattr(model.config, "type_vocab_size", 0) < 2
+        ):
+            self.skipTest("Model does not use token type ids.")
+        model.add_adapter("a")
+        model.freeze_model(True)
+        model.set_active_adapters("a")
+        model.eval()
+        model.to(torch_device)
+
+        input_data = self.get_input_samples(config=model.config)
+        input_data_types = dict(input_data, token_type_ids=torch.ones_like(input_data["input_ids"]))
+        output_1 = model(**input_data)
+        output_types_1 = model(**input_data_types)
+
+        cache = AdapterActivationCache()
+        model.set_adapter_activation_cache(cache)
+        model(**input_data)
+        num_cached = len(cache)
+        self.assertGreater(num_cached, 0)
+        # examples only differing in their token type ids have separate cache entries
+        output_types_2 = model(**input_data_types)
+        self.assertEqual(2 * num_cached, len(cache))
+        output_2 = model(**input_data)
+
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output_types_1[0], output_types_2[0], atol=1e-5))
+
+        model.set_adapter_activation_cache(None)
+
+    def test_grouped_adapter_bottleneck(self):
+        model = self.get_model()
+        model.eval()
+
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.to(torch_device)
+
+        layer = next(m for m in model.modules() if isinstance(m, AdapterLayer) and len(m.adapters) > 0)
+        adapters = (layer.adapters["a"], layer.adapters["b"])
+        self.assertTrue(can_group_adapters(adapters))
+
+        hidden_states = torch.rand(3, 5, adapters[0].input_size, device=torch_device)
+        grouped_up = grouped_adapter_bottleneck(adapters, hidden_states)
+        self.assertEqual((3, 5, 2, adapters[0].input_size), grouped_up.shape)
+        for i, adapter in enumerate(adapters):
+            _, _, up = adapter(hidden_states, residual_input=hidden_states)
+            self.assertTrue(torch.allclose(up, grouped_up[:, :, i], atol=1e-6))
+
+    def test_grouped_adapter_weights_cache(self):
+        model = self.get_model()
+        model.eval()
+
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_adapter_fusion(["a", "b"], set_active=True)
+        model.to(torch_device)
+
+        layer = next(m for m in model.modules() if isinstance(m, AdapterLayer) and len(m.adapter_fusion_layer) > 0)
+        adapter = layer.adapters["a"]
+        input_data = self.get_input_samples(config=model.config)
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            self.assertEqual(1, len(layer._grouped_weights))
+            weights = next(iter(layer._grouped_weights.values()))[1]
+            model(**input_data)
+            self.assertIs(weights, next(iter(layer._grouped_weights.values()))[1])
+
+            # modified weights are stacked again
+            adapter.adapter_up.weight.add_(1.0)
+            output_2 = model(**input_data)
+            self.assertEqual(1, len(layer._grouped_weights))
+            self.assertIsNot(weights, next(iter(layer._grouped_weights.values()))[1])
+            self.assertFalse(torch.allclose(output_1[0], output_2[0]))
+
+            # adapters with hooks are computed separately
+            calls = []
+            handle = adapter.register_forward_hook(lambda module, inputs, outputs: calls.append(module))
+            output_3 = model(**input_data)
+            handle.remove()
+            self.assertGreater(len(calls), 0)
+            self.assertTrue(torch.allclose(output_2[0], output_3[0], atol=1e-5))
+
+        model.add_adapter("c")
+        self.assertEqual(0, len(layer._grouped_weights))
@@ -1,8 +1,12 @@
+import copy
 import unittest
 
+import torch
+
 from tests.models.electra.test_modeling_electra import *
-from transformers import ElectraAdapterModel
-from transformers.testing_utils import require_torch
+from transformers import ElectraAdapterModel, PfeifferConfig
+from transformers.adapters.composition import Stack
+from transformers.testing_utils import require_torch, require_torch_gpu, torch_device
 
 from .methods import BottleneckAdapterTestMixin, CompacterTestMixin, LoRATestMixin, PrefixTuningTestMixin
 from .test_adapter import AdapterTestBase, make_config
@@ -59,4 +63,251 @@ class ElectraClassConversionTest(
     ElectraAdapterTestBase,
     unittest.TestCase,
 ):
-    pass
\ No newline at end of file
+    pass
+
+
+class ElectraCompileTest(ElectraAdapterTestBase, unittest.TestCase):
+    def test_compiled_forward(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            model.config.compile_model = True
+            output_2 = model(**input_data)
+            output_3 = model(**input_data, output_adapter_gating_scores=True)
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output_1[0], output_3[0], atol=1e-5))
+
+    def test_compiled_forward_copy(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        model.config.compile_model = True
+        input_data = self.get_input_samples(config=model.config)
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            # outputs of previous calls are not overwritten
+            output_2 = model(**input_data)
+            self.assertTrue(torch.equal(output_1[0], output_2[0]))
+
+            # copies don't use the functions compiled for the original model
+            model_copy = copy.deepcopy(model)
+            for p in model_copy.parameters():
+                p.data.zero_()
+            output_3 = model_copy(**input_data)
+            self.assertFalse(torch.allclose(output_1[0], output_3[0]))
+
+
+class ElectraBatchedHeadsTest(ElectraAdapterTestBase, unittest.TestCase):
+    def test_forward_heads_batched(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_classification_head("a", num_labels=3)
+        model.add_classification_head("b", num_labels=2, layers=1)
+        model.add_classification_head("c", num_labels=4, multilabel=True)
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+        head_names = ["a", "b", "c"]
+
+        with torch.no_grad():
+            electra_outputs = model.electra(**input_data)
+            outputs = model.forward_heads_batched(head_names, electra_outputs)
+            for head_name, logits in zip(head_names, outputs):
+                self.assertTrue(torch.allclose(model.heads[head_name](electra_outputs)[0], logits, atol=1e-6))
+            self.assertEqual(1, len(model._fused_head_cache))
+
+            # modified weights are picked up
+            model.heads["b"][1].weight.mul_(2.0)
+            outputs = model.forward_heads_batched(head_names, electra_outputs)
+            self.assertTrue(torch.allclose(model.heads["b"](electra_outputs)[0], outputs[1], atol=1e-6))
+            self.assertEqual(1, len(model._fused_head_cache))
+
+        # the cache is cleared in training and if heads are added or deleted
+        model.train()
+        model.forward_heads_batched(head_names, electra_outputs)
+        self.assertEqual(0, len(model._fused_head_cache))
+        model.eval()
+        with torch.no_grad():
+            model.forward_heads_batched(head_names, electra_outputs)
+        model.delete_head("c")
+        self.assertEqual(0, len(model._fused_head_cache))
+
+
+@require_torch_gpu
+class ElectraCudaGraphTest(ElectraAdapterTestBase, unittest.TestCase):
+    def test_cuda_graph_forward(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            model.config.use_cuda_graph = True
+            output_2 = model(**input_data)
+            output_3 = model(**input_data)
+        self.assertEqual(1, len(model._graph_cache))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+        self.assertTrue(torch.allclose(output_1[0], output_3[0], atol=1e-5))
+
+    def test_cuda_graph_stack_buckets(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_tagging_head("b")
+        model.set_active_adapters(Stack("a", "b"))
+        model.to(torch_device)
+        model.eval()
+        model.config.cuda_graph_buckets = (16, 32)
+        input_ids = [ids_tensor((2, seq_len), model.config.vocab_size).to(torch_device) for seq_len in (12, 20)]
+
+        with torch.no_grad():
+            expected = [model(ids)[0] for ids in input_ids]
+            model.config.use_cuda_graph = True
+            for ids in input_ids:
+                model(ids)
+            self.assertEqual(2, len(model._graph_cache))
+
+            # eager passes with other shapes and changes of unrelated adapters don't affect the captured graphs
+            model.config.use_cuda_graph = False
+            model(ids_tensor((3, 7), model.config.vocab_size).to(torch_device))
+            model.config.use_cuda_graph = True
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model(ids)[0], atol=1e-5))
+
+            model.add_adapter("c")
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model(ids)[0], atol=1e-5))
+            self.assertEqual(2, len(model._graph_cache))
+
+    def test_piecewise_cuda_graphs(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+        input_data["attention_mask"] = torch.ones_like(input_data["input_ids"])
+        input_data["attention_mask"][:, -2:] = 0
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            model.electra.capture_piecewise_graphs(
+                [input_data["input_ids"].shape[0]], input_data["input_ids"].shape[1]
+            )
+            output_2 = model(**input_data)
+        self.assertEqual(model.config.num_hidden_layers, len(model.electra._layer_graphs))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+
+    def test_piecewise_cuda_graphs_stack(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a")
+        model.add_adapter("b")
+        model.add_classification_head("b")
+        model.set_active_adapters(Stack("a", "b"))
+        model.to(torch_device)
+        model.eval()
+        seq_len = 16
+        input_ids = [
+            ids_tensor((batch_size, seq_len), model.config.vocab_size).to(torch_device) for batch_size in (1, 8)
+        ]
+
+        with torch.no_grad():
+            expected = [model(ids)[0] for ids in input_ids]
+            model.electra.capture_piecewise_graphs([1, 8], seq_len)
+            self.assertEqual(2 * model.config.num_hidden_layers, len(model.electra._layer_graphs))
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model(ids)[0], atol=1e-5))
+
+            # copies of the model run eagerly
+            model_copy = copy.deepcopy(model)
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model_copy(ids)[0], atol=1e-5))
+
+            # graphs are not used after the weights were moved
+            model.cpu()
+            model.to(torch_device)
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model(ids)[0], atol=1e-5))
+
+            # graphs are released after adapter changes
+            model.add_adapter("c")
+            self.assertTrue(torch.allclose(expected[0], model(input_ids[0])[0], atol=1e-5))
+            self.assertEqual(0, len(model.electra._layer_graphs))
+
+            model.electra.release_piecewise_graphs()
+            for _, layer in model.electra.iter_layers():
+                self.assertNotIn("piecewise_graphs", layer.__dict__)
+            for ids, output in zip(input_ids, expected):
+                self.assertTrue(torch.allclose(output, model(ids)[0], atol=1e-5))
+
+    def test_cuda_graph_buckets(self):
+        # gates are averaged over all tokens, so inputs aren't padded for gated adapters
+        for adapter_config, num_graphs in [(PfeifferConfig(), 2), (PfeifferConfig(use_gating=True), 4)]:
+            with self.subTest(use_gating=adapter_config.use_gating):
+                model = ElectraAdapterModel(self.config())
+                model.add_adapter("a", config=adapter_config, set_active=True)
+                model.add_tagging_head("a")
+                model.to(torch_device)
+                model.eval()
+                model.config.cuda_graph_buckets = (16, 32)
+
+                with torch.no_grad():
+                    for seq_len in (5, 12, 16, 20):
+                        input_ids = ids_tensor((2, seq_len), model.config.vocab_size).to(torch_device)
+                        model.config.use_cuda_graph = False
+                        output_1 = model(input_ids)
+                        model.config.use_cuda_graph = True
+                        output_2 = model(input_ids)
+                        self.assertEqual(output_1[0].shape, output_2[0].shape)
+                        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+                self.assertEqual(num_graphs, len(model._graph_cache))
+
+    def test_cuda_graph_cache_size(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        model.config.cuda_graph_cache_size = 2
+
+        with torch.no_grad():
+            for batch_size in (1, 2, 3):
+                input_ids = ids_tensor((batch_size, 16), model.config.vocab_size).to(torch_device)
+                model.config.use_cuda_graph = False
+                output_1 = model(input_ids)
+                model.config.use_cuda_graph = True
+                output_2 = model(input_ids)
+                self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))
+            # the least recently used graph and its static inputs are released
+            self.assertEqual(2, len(model._graph_cache))
+            self.assertEqual(2, len(model._static_inputs))
+
+    def test_cuda_graph_moved_parameters(self):
+        model = ElectraAdapterModel(self.config())
+        model.add_adapter("a", set_active=True)
+        model.add_classification_head("a")
+        model.to(torch_device)
+        model.eval()
+        input_data = self.get_input_samples(config=model.config)
+
+        with torch.no_grad():
+            output_1 = model(**input_data)
+            model.config.use_cuda_graph = True
+            model(**input_data)
+            # moving the model frees the memory of the parameters read by the captured graph
+            model.cpu()
+            model.to(torch_device)
+            output_2 = model(**input_data)
+        self.assertEqual(1, len(model._graph_cache))
+        self.assertTrue(torch.allclose(output_1[0], output_2[0], atol=1e-5))